@@ -210,8 +210,25 @@ const GraphEditor = () => {
         { method: "POST" }
       );
       if (response.ok) {
-        toast.success(`Embeddings generated for ${label} nodes`);
-        fetchGraphData();
+        // El backend responde 202 y genera los embeddings en segundo plano
+        const { status_url } = await response.json();
+        toast.info(`Embedding job started for ${label} nodes`);
+        let job = { status: "running", updated: 0, error: null };
+        while (job.status === "running" || job.status === "pending") {
+          await new Promise((resolve) => setTimeout(resolve, 2000));
+          const statusResponse = await fetch(`http://localhost:5001${status_url}`);
+          if (!statusResponse.ok)
+            throw new Error(`HTTP error! status: ${statusResponse.status}`);
+          job = await statusResponse.json();
+        }
+        if (job.status === "completed") {
+          toast.success(`Embeddings generated for ${job.updated} ${label} nodes`);
+          fetchGraphData();
+        } else {
+          toast.error(
+            `Embedding job ${job.status}: ${job.error || "Unknown error"}`
+          );
+        }
       } else {
         const errorData = await response.json();
         toast.error(
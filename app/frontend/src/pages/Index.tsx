@@ -44,10 +44,29 @@ const Index = () => {
       try {
         const parsedData = JSON.parse(data);
         
-        // Handle AI messages
+        // Handle streamed AI tokens: se acumulan en un mensaje provisional
+        if (parsedData.AI_delta) {
+          setChatMessages(prev => {
+            const last = prev[prev.length - 1];
+            if (last && last.streaming) {
+              return [...prev.slice(0, -1), { ...last, content: last.content + parsedData.AI_delta }];
+            }
+            return [
+              ...prev,
+              { sender: 'ai', content: parsedData.AI_delta, streaming: true, timestamp: new Date().toISOString() },
+            ];
+          });
+        }
+
+        // El agente fue a buscar a su memoria: el texto provisional se descarta
+        if (parsedData.progress && parsedData.progress.stage === 'memory_hop') {
+          setChatMessages(prev => prev.filter(msg => !msg.streaming));
+        }
+
+        // Handle AI messages (la respuesta final reemplaza al mensaje provisional)
         if (parsedData.AI) {
           setChatMessages(prev => [
-            ...prev,
+            ...prev.filter(msg => !msg.streaming),
             { sender: 'ai', content: parsedData.AI, timestamp: new Date().toISOString() },
           ]);
         }
@@ -1,11 +1,11 @@
 from myagent.graph import compilegraph
-from langgraph.checkpoint.memory import MemorySaver
+from myagent.utils.checkpointer import SQLiteCheckpointer
 from langgraph.store.memory import InMemoryStore
 from langchain_core.messages import HumanMessage
 
 
 config = {"configurable": {"thread_id": 1, "user_id": "1"}}
-memory = MemorySaver()
+memory = SQLiteCheckpointer()
 long_term_memory = InMemoryStore()
 
 template_graph= compilegraph(checkpointer=memory,long_term_memory=long_term_memory)
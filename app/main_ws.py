@@ -1,30 +1,51 @@
+import sys
+
+if __name__ == "__main__" and "--profile-startup" in sys.argv:
+    #Se mide antes de importar nada pesado: el perfil corre en un proceso limpio
+    from myagent.utils.startup_profile import profile_startup
+    sys.exit(profile_startup(__file__))
+
 import asyncio
-import websockets
 import json
-import threading
-from flask import Flask, jsonify, request
+import socket
+import uuid
+from urllib.parse import parse_qs
+from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
 from myagent.graph import compilegraph
 from langchain_core.messages import HumanMessage, ToolMessage
 from myagent.utils import tools
-from asyncio import WindowsSelectorEventLoopPolicy
-from langgraph.checkpoint.memory import MemorySaver
+from myagent.utils import graph_version
+from myagent.utils.embeddings import EmbeddingService
+from myagent.utils.embedding_jobs import EmbeddingJobManager, DEFAULT_BATCH_SIZE
+from myagent.utils.retrieval import stream_vector_search, strip_internal_properties, visible_labels
+from myagent.utils.vector_index import LocalVectorIndex
+from myagent.utils.asgi import create_asgi_app
+from myagent.utils.scheduler import SessionScheduler, SchedulerBusy
+from myagent.utils.streaming import stream_reply
+from myagent.utils.response_cache import ResponseCache, StreamResult
+from myagent.utils.checkpointer import SQLiteCheckpointer
 from langgraph.store.memory import InMemoryStore
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, AsyncGraphDatabase
 import datetime
 import dotenv
 import os
-from openai import OpenAI
 import subprocess
-from icrawler.builtin import GoogleImageCrawler
 import base64
 import tempfile
 import shutil
-from icrawler.builtin import BingImageCrawler
+from functools import lru_cache
 
 dotenv.load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key)
+
+@lru_cache(maxsize=1)
+def get_openai_client():
+    #openai se importa recién cuando hace falta un embedding que no está en cache
+    from openai import OpenAI
+    return OpenAI(api_key=api_key)
+
+embedding_service = EmbeddingService(client_factory=get_openai_client)
 
 
 
@@ -62,29 +83,58 @@ def format_value(value):
         return "'" + value.replace("'", "\\'") + "'"
 
 
-asyncio.set_event_loop_policy(WindowsSelectorEventLoopPolicy())
 
-
-codigo = "20190051"
-in_memory_checkpointer = MemorySaver()
+checkpointer = SQLiteCheckpointer()
 long_term_in_memory = InMemoryStore()
 template_graph = None
+scheduler = None
 
 NEO4J_URI = os.getenv("NEO4J_URI")
 NEO4J_USER = os.getenv("NEO4J_USER")    
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 
+#El driver síncrono queda solo para las rutas Flask; el agente (websocket) usa el async
+#para que una consulta lenta no congele el event loop de todas las conexiones.
 driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+agent_driver = AsyncGraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+local_index = LocalVectorIndex()
+embedding_jobs = EmbeddingJobManager(
+    driver, embedding_service,
+    on_batch=lambda element_ids: on_embedding_batch(element_ids),
+)
+
+def on_embedding_batch(element_ids):
+    #Los embeddings no se ven en /api/graph-data, pero quedan en el log para que el índice local los relea
+    revision = graph_version.record(embedded=element_ids)
+    sync_local_index(revision, element_ids=element_ids)
+
+def sync_local_index(revision, node_ids=None, element_ids=None):
+    #Atajo: refresca ya lo que escribió la ruta y adelanta la revisión del índice, así no lo relee sync().
+    #Si falla, la escritura no se revierte y el índice se pone al día solo desde el log de revisiones.
+    ids = node_ids or element_ids
+    if not ids:
+        return
+    try:
+        if node_ids:
+            local_index.refresh_node_ids(driver, node_ids)
+        else:
+            local_index.refresh_element_ids(driver, element_ids)
+        #record() escribe sus filas juntas: la revisión anterior a esta escritura es revision - len(ids)
+        local_index.advance(revision - len(ids), revision)
+    except Exception as e:
+        print_colored(f"No se pudo sincronizar el índice vectorial local: {e}", 31)
 
 app = Flask(__name__)
 CORS(app)
+#Respuestas de lectura (grafo, índices) cacheadas por revisión del grafo, con ETag y cuerpos ya comprimidos
+response_cache = ResponseCache()
 
 def run_frontend():
     print_colored("Iniciando el servidor de desarrollo de React...", 32)
     cwd = os.path.join(os.path.dirname(__file__), "frontend")
     print_colored(f"Directorio de trabajo: {cwd}", 34)
 
-    subprocess.Popen(
+    return subprocess.Popen(
         "npm run dev",
         cwd=cwd,
         shell=True
@@ -122,6 +172,8 @@ def search_images():
                     break
 
     else:
+        #icrawler es pesado de importar: solo se carga cuando se usa el crawler
+        from icrawler.builtin import BingImageCrawler
         print_colored(f"Buscando imágenes en Bing para la consulta: {query}", 32)
         temp_dir = tempfile.mkdtemp(prefix="img_search_")
         try:
@@ -143,51 +195,195 @@ def search_images():
 
     return block, 200, {"Content-Type":"text/plain"}
 
+#Nodos y sus relaciones salientes en una sola consulta; los embeddings se descartan en el servidor.
+#Cada relación sale una sola vez, agrupada con su nodo de origen. Las relaciones se arman con una
+#comprensión de patrones por nodo (sin collect global), así las filas salen a medida que se leen.
+GRAPH_ROWS_RETURN = """
+RETURN ID(n) AS id, labels(n) AS labels, n {.*, embedding: null} AS properties,
+       [(n)-[r]->(m) | {id: elementId(r), type: type(r), target: ID(m), properties: r {.*, embedding: null}}] AS links
+"""
+GRAPH_DATA_QUERY = "MATCH (n)" + GRAPH_ROWS_RETURN
+GRAPH_PAGE_QUERY = (
+    "MATCH (n) WHERE ID(n) > $after\nWITH n ORDER BY ID(n) LIMIT $limit" + GRAPH_ROWS_RETURN + "ORDER BY id\n"
+)
+GRAPH_STREAM_CHUNK = 500
+GRAPH_LINKS_READ_BYTES = 256 * 1024
+
+#Para /api/graph-data/changes: solo las entidades que cambiaron, con la misma forma que /api/graph-data
+NODES_BY_ID_QUERY = """
+MATCH (n) WHERE ID(n) IN $ids
+RETURN ID(n) AS id, labels(n) AS labels, n {.*, embedding: null} AS properties, [] AS links
+"""
+LINKS_BY_ID_QUERY = """
+MATCH (a)-[r]->(b) WHERE elementId(r) IN $ids
+RETURN ID(a) AS source, {id: elementId(r), type: type(r), target: ID(b), properties: r {.*, embedding: null}} AS link
+"""
+
+def link_payload(source_id, link):
+    return {
+        "source": str(source_id),
+        "target": str(link["target"]),
+        "type": link["type"],
+        "properties": convert_datetime(strip_internal_properties(link["properties"])),
+        "id": link["id"],
+    }
+
+def graph_row_payload(record):
+    node = convert_datetime(strip_internal_properties(record["properties"]))
+    node["elementId"] = str(record["id"])
+    node["labels"] = visible_labels(record["labels"])
+    links = [link_payload(record["id"], link) for link in record["links"]]
+    return node, links
+
+def open_graph_stream():
+    #Se abre la consulta y se espera el primer registro antes de mandar los headers:
+    #si Neo4j no responde, la ruta todavía puede devolver un error en vez de un 200
+    session = driver.session()
+    try:
+        result = session.run(GRAPH_DATA_QUERY)
+        result.peek()
+    except Exception:
+        session.close()
+        raise
+    return session, result
+
+def stream_graph_data(session, records, stream_result):
+    #El cuerpo se va escribiendo mientras llegan los registros. Las relaciones van después de los nodos,
+    #así que cada página de relaciones se serializa a un archivo temporal y se relee al final: en memoria
+    #nunca hay más que una página de nodos o de relaciones
+    links_file = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+    try:
+        error = None
+        yield '{"nodes": ['
+        chunk = []
+        try:
+            first = True
+            first_link = True
+            page_links = []
+            for record in records:
+                node, node_links = graph_row_payload(record)
+                page_links.extend(node_links)
+                chunk.append(("" if first else ",") + json.dumps(node, ensure_ascii=False, default=str))
+                first = False
+                if len(chunk) >= GRAPH_STREAM_CHUNK:
+                    yield "".join(chunk)
+                    chunk = []
+                    first_link = write_links_page(links_file, page_links, first_link)
+                    page_links = []
+            write_links_page(links_file, page_links, first_link)
+        except Exception as e:
+            #Los headers (200) ya salieron: el error va en el cuerpo y la respuesta no se cachea
+            print_colored(f"Error al transmitir el grafo: {e}", 31)
+            error = f"Error retrieving graph data: {str(e)}"
+        finally:
+            session.close()
+        yield "".join(chunk) + '], "links": ['
+        links_file.seek(0)
+        while True:
+            page = links_file.read(GRAPH_LINKS_READ_BYTES)
+            if not page:
+                break
+            yield page
+        tail = "]"
+        if error:
+            tail += ', "error": ' + json.dumps(error)
+        yield tail + "}"
+        stream_result.ok = error is None
+    finally:
+        links_file.close()
+
+def write_links_page(links_file, links, first):
+    """Agrega una página de relaciones (ya como JSON separado por comas) al archivo; devuelve si sigue vacío."""
+    if not links:
+        return first
+    links_file.write(("" if first else ",") + ",".join(json.dumps(link, ensure_ascii=False, default=str) for link in links))
+    return False
+
 @app.route('/api/graph-data', methods=['GET'])
+@response_cache.cached_by_revision
 def get_graph_data():
+    #?limit=N&after=<next_cursor> devuelve una página; sin limit se transmite el grafo completo por partes
+    #La revisión se lee antes que los datos: si algo cambia durante la lectura, /changes lo vuelve a mandar
+    revision = graph_version.current()
+    limit = request.args.get("limit", type=int)
+    if not limit:
+        try:
+            session, records = open_graph_stream()
+        except Exception as e:
+            return jsonify({"error": f"Error retrieving graph data: {str(e)}"}), 400
+        stream_result = StreamResult()
+        response = Response(
+            stream_graph_data(session, records, stream_result),
+            mimetype="application/json", headers={"X-Graph-Revision": str(revision)},
+        )
+        response.stream_result = stream_result
+        #Si el cuerpo nunca se recorre (p. ej. HEAD) el generador no llega a su finally
+        response.call_on_close(session.close)
+        return response
+    after = request.args.get("after", -1, type=int)
     try:
         with driver.session() as session:
-            nodes_result = session.run("MATCH (n) RETURN n")
-            nodes = {}
-            for record in nodes_result:
-                n = record["n"]
-                node_properties = dict(n._properties)
-                node_properties = convert_datetime(node_properties)
-                node_properties["elementId"] = str(n.id)
-                node_properties["labels"] = list(n.labels)
-                nodes[n.id] = node_properties
-
-            rels_result = session.run("MATCH (n)-[r]->(m) RETURN r")
+            nodes = []
             links = []
-            for record in rels_result:
-                r = record["r"]
-                link_properties = dict(r._properties)
-                link_properties = convert_datetime(link_properties)
-                links.append({
-                    "source": str(r.start_node.id),
-                    "target": str(r.end_node.id),
-                    "type": r.type,
-                    "properties": link_properties,
-                    "id": r.element_id  
-                })
-            nodes_list = list(nodes.values())
-            return jsonify({"nodes": nodes_list, "links": links})
+            last_id = None
+            for record in session.run(GRAPH_PAGE_QUERY, after=after, limit=limit):
+                node, node_links = graph_row_payload(record)
+                nodes.append(node)
+                links.extend(node_links)
+                #El cursor es el mayor ID de la página, sin depender del orden de las filas
+                last_id = record["id"] if last_id is None else max(last_id, record["id"])
+        next_cursor = last_id if len(nodes) == limit else None
+        response = jsonify({"nodes": nodes, "links": links, "next_cursor": next_cursor, "revision": revision})
+        response.headers["X-Graph-Revision"] = str(revision)
+        return response
     except Exception as e:
         return jsonify({"error": f"Error retrieving graph data: {str(e)}"}), 400
 
+@app.route('/api/graph-data/changes', methods=['GET'])
+def get_graph_changes():
+    #Devuelve lo agregado, modificado o borrado desde ?since=<revision>; con reset=true el cliente debe recargar todo
+    since = request.args.get("since", type=int)
+    if since is None:
+        return jsonify({"error": "Missing since revision"}), 400
+    changes = graph_version.changes_since(since)
+    payload = {"revision": changes["revision"], "since": since, "reset": changes["reset"],
+               "nodes": [], "links": [], "removed_nodes": [], "removed_links": []}
+    if changes["reset"]:
+        return jsonify(payload)
+    try:
+        with driver.session() as session:
+            if changes["nodes"]:
+                node_ids = [int(node_id) for node_id in changes["nodes"]]
+                for record in session.run(NODES_BY_ID_QUERY, ids=node_ids):
+                    node, _ = graph_row_payload(record)
+                    payload["nodes"].append(node)
+            if changes["links"]:
+                for record in session.run(LINKS_BY_ID_QUERY, ids=changes["links"]):
+                    payload["links"].append(link_payload(record["source"], record["link"]))
+        #Lo que se registró como cambiado pero ya no existe también se informa como borrado
+        found_nodes = {node["elementId"] for node in payload["nodes"]}
+        found_links = {link["id"] for link in payload["links"]}
+        payload["removed_nodes"] = changes["removed_nodes"] + [i for i in changes["nodes"] if i not in found_nodes]
+        payload["removed_links"] = changes["removed_links"] + [i for i in changes["links"] if i not in found_links]
+        return jsonify(payload)
+    except Exception as e:
+        return jsonify({"error": f"Error retrieving graph changes: {str(e)}"}), 400
+
 @app.route('/api/graph-data/por-relacion/<relation_type>', methods=['GET'])
+@response_cache.cached_by_revision
 def get_nodes_by_relation(relation_type):
     try:
         with driver.session() as session:
-            query = f"MATCH (n)-[r:{relation_type}]->() RETURN DISTINCT n"
+            query = (
+                f"MATCH (n)-[r:{relation_type}]->() WITH DISTINCT n "
+                f"RETURN ID(n) AS id, labels(n) AS labels, n {{.*, embedding: null}} AS properties"
+            )
             result = session.run(query)
             nodes = []
             for record in result:
-                n = record["n"]
-                node_properties = dict(n._properties)
-                node_properties = convert_datetime(node_properties)
-                node_properties["elementId"] = str(n.id)
-                node_properties["labels"] = list(n.labels)
+                node_properties = convert_datetime(strip_internal_properties(record["properties"]))
+                node_properties["elementId"] = str(record["id"])
+                node_properties["labels"] = visible_labels(record["labels"])
                 nodes.append(node_properties)
             return jsonify({"nodes": nodes})
     except Exception as e:
@@ -204,7 +400,11 @@ def execute_query_http():
         with driver.session() as session:
             result = session.run(query)
             records = [record.data() for record in result]
-            return jsonify(records)
+            summary = result.consume()
+        #Cypher libre: si escribió no sabemos qué tocó, así que los clientes deben recargar el grafo
+        if summary.query_type != "r":
+            graph_version.bump()
+        return jsonify(records)
     except Exception as e:
         return jsonify({"error": f"Error executing query: {str(e)}"}), 400
 
@@ -217,13 +417,15 @@ def create_node():
     labelString = ":" + ":".join(labels) if labels else ""
     propsArray = [f"{key}: {format_value(value)}" for key, value in properties.items()]
     propsString = "{" + ", ".join(propsArray) + "}" if propsArray else "{}"
-    query = f"CREATE (n{labelString} {propsString}) RETURN ID(n) as nodeId"
+    query = f"CREATE (n{labelString} {propsString}) RETURN ID(n) as nodeId, elementId(n) as elementId"
     print_colored(f"Ejecutando consulta para crear nodo: {query}", 35)
     try:
         with driver.session() as session:
             result = session.run(query)
             records = [record.data() for record in result]
-            return jsonify(records)
+        revision = graph_version.record(nodes=[record["nodeId"] for record in records])
+        sync_local_index(revision, element_ids=[record["elementId"] for record in records])
+        return jsonify(records)
     except Exception as e:
         return jsonify({"error": f"Error creating node: {str(e)}"}), 400
 
@@ -242,6 +444,8 @@ def update_node(node_id):
                 setQuery = f"MATCH (n) WHERE ID(n) = {node_id} SET n:{':'.join(labels)}"
                 print_colored(f"Ejecutando consulta para actualizar etiquetas: {setQuery}", 35)
                 session.run(setQuery)
+        revision = graph_version.record(nodes=[node_id])
+        sync_local_index(revision, node_ids=[node_id])
         return jsonify({"message": "Node updated successfully"})
     except Exception as e:
         print_colored(f"Error al actualizar el nodo: {e}", 31)
@@ -253,6 +457,8 @@ def delete_property(node_id, prop_key):
         query = f"MATCH (n) WHERE ID(n) = {node_id} REMOVE n.{prop_key}"
         with driver.session() as session:
             session.run(query)
+        revision = graph_version.record(nodes=[node_id])
+        sync_local_index(revision, node_ids=[node_id])
         return jsonify({"message": "Property deleted successfully"})
     except Exception as e:
         return jsonify({"error": f"Error deleting property: {str(e)}"}), 400
@@ -274,36 +480,41 @@ def create_relationship():
         with driver.session() as session:
             result = session.run(query)
             records = [record.data() for record in result]
-            return jsonify(records)
+        graph_version.record(links=[record["relId"] for record in records])
+        return jsonify(records)
     except Exception as e:
         return jsonify({"error": f"Error creating relationship: {str(e)}"}), 400
 
 @app.route('/api/generate_embedding/<label>', methods=['POST'])
 def generate_embedding(label):
+    data = request.get_json(silent=True) or {}
+    try:
+        batch_size = int(data.get("batchSize", request.args.get("batch_size", DEFAULT_BATCH_SIZE)))
+        if batch_size <= 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({"error": "batchSize must be a positive integer"}), 400
     try:
         print("Generando embedding para label:", label)
-
-        query = f"MATCH (n:{label}) WHERE n.embedding IS NULL RETURN n"
-        with driver.session() as session:
-            result = session.run(query)
-            nodes_to_update = [record["n"] for record in result]
-            updated_count = 0
-            for n in nodes_to_update:
-                descripcion = n._properties.get("description")
-                if not descripcion:
-                    continue
-                openai_response = client.embeddings.create(
-                    input=descripcion,
-                    model="text-embedding-3-small"
-                )
-                embedding_vector = openai_response.data[0].embedding
-                update_query = f"MATCH (n) WHERE elementId(n) = '{n.element_id}' SET n.embedding = {json.dumps(embedding_vector)}"
-                session.run(update_query)
-                updated_count += 1
-            return jsonify({"message": f"Embeddings generated for {updated_count} nodes with label '{label}'."})
+        job = embedding_jobs.start(label, batch_size=batch_size)
+        return jsonify({
+            "message": f"Embedding job started for label '{label}'.",
+            "status_url": f"/api/generate_embedding/{label}/status",
+            "job": job.checkpoint(),
+        }), 202
     except Exception as e:
         return jsonify({"error": f"Error generating embeddings: {str(e)}"}), 400
 
+@app.route('/api/generate_embedding/<label>/status', methods=['GET'])
+def generate_embedding_status(label):
+    job = embedding_jobs.get(label)
+    if job is None:
+        return jsonify({"error": f"No embedding job found for label '{label}'"}), 404
+    try:
+        return jsonify(job.status_report())
+    except Exception as e:
+        return jsonify({"error": f"Error reading embedding job status: {str(e)}"}), 400
+
 
 @app.route('/api/vector-index/nodes', methods=['POST'])
 def create_vector_index_nodes():
@@ -325,6 +536,7 @@ def create_vector_index_nodes():
     try:
         with driver.session() as session:
             session.run(query)
+        graph_version.record()
         return jsonify({"message": f"Vector index '{indexName}' created for label '{label}'."})
     except Exception as e:
         return jsonify({"error": f"Error creating vector index: {str(e)}"}), 400
@@ -349,11 +561,13 @@ def create_vector_index_relationships():
     try:
         with driver.session() as session:
             session.run(query)
+        graph_version.record()
         return jsonify({"message": f"Vector index '{indexName}' created for relationship type '{relType}'."})
     except Exception as e:
         return jsonify({"error": f"Error creating vector index for relationships: {str(e)}"}), 400
 
 @app.route('/api/vector-indexes', methods=['GET'])
+@response_cache.cached_by_revision
 def show_vector_indexes():
     query = "SHOW VECTOR INDEXES"
     try:
@@ -389,94 +603,153 @@ def vector_search_nodes():
     if not isinstance(query_text, str):
         return jsonify({"error": "queryVector must be a text string"}), 400
 
-    openai_response = client.embeddings.create(
-        input=query_text,
-        model="text-embedding-3-small"
-    )
-    queryVector = openai_response.data[0].embedding
-    if not indexName or k is None or queryVector is None:
+    if not indexName or k is None:
         return jsonify({"error": "Missing required parameters: indexName, numberOfNearestNeighbours and queryVector"}), 400
 
-    query = f"""
-    CALL db.index.vector.queryNodes('{indexName}', {k}, {json.dumps(queryVector)})
-    YIELD node, score
-    RETURN node, score
-    """
     try:
-        with driver.session() as session:
-            result = session.run(query)
-            records = [record.data() for record in result]
+        queryVector = embedding_service.embed(query_text)
+        records = list(stream_vector_search(driver, indexName, k, queryVector))
         return jsonify({"results": records})
     except Exception as e:
         return jsonify({"error": f"Error executing vector search: {str(e)}"}), 400
 
-    
+@app.route('/api/local-index', methods=['GET'])
+def local_index_stats():
+    return jsonify(local_index.stats())
 
+@app.route('/api/local-index/reload', methods=['POST'])
+def reload_local_index():
+    if not local_index.available:
+        return jsonify({"error": "Local vector index is disabled or numpy is not installed"}), 400
+    local_index.load_in_background(driver)
+    return jsonify({"message": "Local vector index reload started."}), 202
 
-def run_flask():
-    app.run(port=5001)
+@app.route('/api/embeddings/stats', methods=['GET'])
+def embedding_cache_stats():
+    return jsonify(embedding_service.stats())
 
+@app.route('/api/response-cache/stats', methods=['GET'])
+def response_cache_stats():
+    return jsonify(response_cache.stats())
 
-async def process_message(websocket):
-    config = {
-        "configurable": {"thread_id": codigo, "codigo": codigo},
-        "websocket": websocket,
-        "driver": driver,
-        "client": client,
+
+@app.route('/api/sessions/stats', methods=['GET'])
+def session_stats():
+    if scheduler is None:
+        return jsonify({"error": "Server is not running"}), 503
+    return jsonify(scheduler.stats())
+
+
+def get_session_id(websocket):
+    #El cliente puede retomar su conversación con ws://...?session_id=<id>; si no, cada conexión es una sesión nueva
+    query = parse_qs(websocket.scope.get("query_string", b"").decode("latin1"))
+    session_id = (query.get("session_id") or [""])[0].strip()
+    return session_id or uuid.uuid4().hex
+
+#Con STREAM_REPLIES=0 se vuelve a esperar la corrida completa y mandar un solo {"AI": ...}
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "1") != "0"
+
+async def answer_message(websocket, config, message):
+    inputs = {
+        "messages": [HumanMessage(content=message)],
+        "informacion_trabajo": "Todavía no hay información de trabajo, se ha realizado una nueva interacción.Esperando razonamiento del asistente.",
     }
-    async for message in websocket:
-        if message.strip() == "exit":
-            await websocket.send("Comando de salida recibido.")
-            break
-
-
-        response = await template_graph.ainvoke({
-            "messages": [HumanMessage(content=message)],
-            "informacion_trabajo": "Todavía no hay información de trabajo, se ha realizado una nueva interacción.Esperando razonamiento del asistente.",
-        }, config)
-        
-        print("\n--------------------------")
-        print("Human:", message)
-        print("--------------------------")
+    if STREAM_REPLIES:
+        assistant_response = await stream_reply(template_graph, inputs, config, websocket.send)
+    else:
+        response = await template_graph.ainvoke(inputs, config)
         if not isinstance(response["messages"][-1], ToolMessage):
             assistant_response = response["messages"][-1].content
         else:
             assistant_response = response["messages"][-2].content
-        print("Assistant:", assistant_response)
-        print("--------------------------\n")
-
-        payload = {"AI": assistant_response}
-        await websocket.send(json.dumps(payload))
+    
+    print("\n--------------------------")
+    print("Human:", message)
+    print("--------------------------")
+    print("Assistant:", assistant_response)
+    print("--------------------------\n")
 
-def run_websocket_server():
-    loop = asyncio.new_event_loop() 
-    asyncio.set_event_loop(loop)
+    payload = {"AI": assistant_response}
+    await websocket.send(json.dumps(payload))
 
-    async def start_server():
-        server = await websockets.serve(process_message, "localhost", 6789)
-        print("Servidor WebSocket iniciado en ws://localhost:6789")
-        await asyncio.Future()
+async def schedule_message(websocket, config, message):
+    session_id = config["configurable"]["thread_id"]
+    try:
+        await scheduler.run(session_id, lambda: answer_message(websocket, config, message))
+    except SchedulerBusy:
+        await websocket.send(json.dumps({"AI": "Todavía estoy respondiendo tus mensajes anteriores, espera un momento por favor."}))
+    except Exception as e:
+        print_colored(f"Error en la sesión {session_id}: {e}", 31)
+        await websocket.send(json.dumps({"AI": "Ocurrió un error al procesar tu mensaje."}))
 
-    loop.run_until_complete(start_server())
+async def process_message(websocket):
+    session_id = get_session_id(websocket)
+    config = {
+        "configurable": {
+            "thread_id": session_id,
+            "websocket": websocket,
+            "driver": agent_driver,
+            "embeddings": embedding_service,
+            "local_index": local_index,
+        },
+    }
+    print_colored(f"Nueva conexión, sesión {session_id}", 34)
+    await websocket.send(json.dumps({"session_id": session_id}))
+    #Cada mensaje se encola en el scheduler; el loop sigue leyendo para poder recibir "exit" o detectar la desconexión
+    pending = set()
+    try:
+        async for message in websocket:
+            if message.strip() == "exit":
+                await websocket.send("Comando de salida recibido.")
+                break
+            task = asyncio.create_task(schedule_message(websocket, config, message))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending and not websocket.closed:
+            await asyncio.gather(*pending)
+    finally:
+        #Si el cliente se fue, las corridas que quedan (y sus llamadas al LLM/Neo4j) se cancelan
+        for task in pending:
+            task.cancel()
+
+HOST = os.getenv("HOST", "localhost")
+#La API REST y el websocket comparten el mismo servidor; se escucha en ambos puertos para no romper al frontend
+API_PORT = int(os.getenv("API_PORT", "5001"))
+WS_PORT = int(os.getenv("WS_PORT", "6789"))
+PORTS = (API_PORT, WS_PORT)
+
+async def on_startup():
+    global template_graph, scheduler
+    scheduler = SessionScheduler()
+    #Siembra la revisión en memoria antes de aceptar requests; después current() no lee SQLite
+    await asyncio.to_thread(graph_version.current)
+    template_graph = compilegraph(checkpointer=checkpointer, long_term_memory=long_term_in_memory)
+    if local_index.available:
+        local_index.load_in_background(driver)
+    print_colored(f"API REST escuchando en http://{HOST}:{API_PORT}", 32)
+    print_colored(f"Websocket del agente escuchando en ws://{HOST}:{WS_PORT}", 32)
+
+async def on_shutdown():
+    print_colored("Cerrando la aplicación...", 33)
+    await agent_driver.close()
+    driver.close()
+
+def bind_sockets(host, ports):
+    return [socket.create_server((host, port)) for port in ports]
 
 def main():
-    global template_graph
-    template_graph = compilegraph(checkpointer=in_memory_checkpointer, long_term_memory=long_term_in_memory)
-    
-    t_front = threading.Thread(target=run_frontend, daemon=True)
-    t_front.start()
-    
-    flask_thread = threading.Thread(target=run_flask, daemon=True)
-    flask_thread.start()
-    
-    ws_thread = threading.Thread(target=run_websocket_server, daemon=True)
-    ws_thread.start()
+    #uvicorn se importa acá para que importar main_ws (p. ej. --profile-startup) no lo cargue
+    import uvicorn
+
+    frontend = run_frontend() if "--frontend" in sys.argv else None
+    asgi_app = create_asgi_app(app, process_message, on_startup=on_startup, on_shutdown=on_shutdown)
+    #loop="auto" usa uvloop si está instalado; uvicorn maneja SIGINT/SIGTERM y apaga ordenadamente
+    config = uvicorn.Config(asgi_app, loop="auto", lifespan="on", log_level="info")
     try:
-        while True:
-            pass
-    except KeyboardInterrupt:
-        print("Cerrando la aplicación...")
+        uvicorn.Server(config).run(sockets=bind_sockets(HOST, PORTS))
+    finally:
+        if frontend is not None:
+            frontend.terminate()
 
 if __name__ == "__main__":
     main()
-
@@ -1,6 +1,6 @@
 #Code and logic for graph compilation
 from .utils.state import OverallState
-from .utils.nodes_edges import dig_into_memories,dig_into_memories_tool_condition,analazing_next_node
+from .utils.nodes_edges import dig_into_memories,dig_into_memories_tool_condition,analazing_next_node,summarize_conversation
 from langgraph.graph import StateGraph, MessagesState, END, START
 
 from langgraph.prebuilt import tools_condition
@@ -9,15 +9,16 @@ from langgraph.prebuilt import tools_condition
 
 builder = StateGraph(OverallState)
 
+builder.add_node("summarize_conversation", summarize_conversation)
 builder.add_node("dig_into_memories",dig_into_memories)
 builder.add_node("analazing_next_node", analazing_next_node)
-builder.add_edge(START, "dig_into_memories")
+builder.add_edge(START, "summarize_conversation")
+builder.add_edge("summarize_conversation", "dig_into_memories")
 builder.add_edge("dig_into_memories", "analazing_next_node")
 builder.add_conditional_edges(
-    "dig_into_memories",
+    "analazing_next_node",
     dig_into_memories_tool_condition,
 )
-builder.add_edge("tools2", "dig_into_memories")
 
 
 
@@ -0,0 +1,216 @@
+#Servidor unificado: la API Flask (WSGI) y el websocket del agente comparten una sola app ASGI y un solo event loop.
+#Flask corre en un pool de hilos (sus rutas usan el driver síncrono); el websocket corre directo en el loop.
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+REST_WORKERS = int(os.getenv("REST_WORKERS", "16"))
+
+
+def build_environ(scope: dict, body: bytes) -> dict:
+    """Traduce un scope HTTP de ASGI al environ que espera una app WSGI (PEP 3333)."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "REMOTE_ADDR": str(client[0]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+        #El cuerpo ya se leyó entero: si vino chunked no hay Content-Length y werkzeug lo daría por vacío
+        "wsgi.input_terminated": True,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin1").upper().replace("-", "_")
+        value = raw_value.decode("latin1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+            continue
+        if name in ("CONTENT_LENGTH", "TRANSFER_ENCODING"):
+            continue
+        key = "HTTP_" + name
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    environ["CONTENT_LENGTH"] = str(len(body))
+    return environ
+
+
+class WSGIBridge:
+    """
+    Monta una app WSGI dentro de ASGI. Cada request corre en un hilo del pool y
+    el cuerpo de la respuesta se envía por partes a medida que la app lo genera.
+
+    Args:
+        wsgi_app: App WSGI (p. ej. la de Flask).
+        max_workers (int): Requests REST atendidos en paralelo.
+    """
+
+    def __init__(self, wsgi_app, max_workers: int = REST_WORKERS):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rest")
+
+    async def __call__(self, scope, receive, send):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        loop = asyncio.get_running_loop()
+        environ = build_environ(scope, bytes(body))
+        await loop.run_in_executor(self.executor, self._run, environ, send, loop)
+
+    def _run(self, environ, send, loop):
+        def send_from_thread(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [
+                (name.lower().encode("latin1"), value.encode("latin1")) for name, value in headers
+            ]
+            return lambda data: send_body(data, more_body=True)
+
+        started = False
+
+        def send_body(data, more_body):
+            nonlocal started
+            if not started:
+                send_from_thread({
+                    "type": "http.response.start",
+                    "status": response["status"],
+                    "headers": response["headers"],
+                })
+                started = True
+            send_from_thread({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                if chunk:
+                    send_body(chunk, more_body=True)
+            send_body(b"", more_body=False)
+        finally:
+            close = getattr(result, "close", None)
+            if close is not None:
+                close()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ASGIWebSocket:
+    """
+    Adaptador con la misma interfaz que usa process_message de la librería websockets:
+    `async for message in websocket` y `await websocket.send(texto)`.
+    """
+
+    def __init__(self, scope, receive, send):
+        self.scope = scope
+        self._receive = receive
+        self._send = send
+        self.closed = False
+        client = scope.get("client")
+        self.remote_address = tuple(client) if client else None
+
+    async def accept(self):
+        await self._send({"type": "websocket.accept"})
+
+    async def send(self, data):
+        if self.closed:
+            return
+        if isinstance(data, bytes):
+            await self._send({"type": "websocket.send", "bytes": data})
+        else:
+            await self._send({"type": "websocket.send", "text": data})
+
+    async def recv(self):
+        """Devuelve el siguiente mensaje, o None cuando el cliente se desconecta."""
+        while True:
+            message = await self._receive()
+            if message["type"] == "websocket.disconnect":
+                self.closed = True
+                return None
+            if message["type"] == "websocket.receive":
+                return message.get("text") if message.get("text") is not None else message.get("bytes")
+
+    async def __aiter__(self):
+        while True:
+            message = await self.recv()
+            if message is None:
+                return
+            yield message
+
+    async def close(self, code: int = 1000):
+        if not self.closed:
+            self.closed = True
+            try:
+                await self._send({"type": "websocket.close", "code": code})
+            except Exception:
+                #El cliente ya se fue; no hay nada que cerrar
+                pass
+
+
+def create_asgi_app(wsgi_app, websocket_handler, on_startup=None, on_shutdown=None):
+    """
+    Arma la app ASGI: HTTP va a la app WSGI, cualquier websocket va al handler del agente.
+
+    Args:
+        wsgi_app: App WSGI con la API REST.
+        websocket_handler: Corrutina handler(websocket) que atiende una conexión.
+        on_startup: Corrutina opcional que se ejecuta al arrancar el servidor (lifespan).
+        on_shutdown: Corrutina opcional que se ejecuta al apagarlo (SIGINT/SIGTERM).
+    Returns:
+        callable: App ASGI.
+    """
+    bridge = WSGIBridge(wsgi_app)
+
+    async def lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    if on_startup is not None:
+                        await on_startup()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                try:
+                    if on_shutdown is not None:
+                        await on_shutdown()
+                finally:
+                    bridge.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def app(scope, receive, send):
+        if scope["type"] == "http":
+            await bridge(scope, receive, send)
+        elif scope["type"] == "websocket":
+            websocket = ASGIWebSocket(scope, receive, send)
+            await websocket.accept()
+            try:
+                await websocket_handler(websocket)
+            finally:
+                await websocket.close()
+        elif scope["type"] == "lifespan":
+            await lifespan(receive, send)
+
+    return app
@@ -0,0 +1,353 @@
+#Checkpointer persistente para LangGraph sobre SQLite (WAL), en reemplazo de MemorySaver.
+#Cada canal se guarda solo cuando cambia su versión, y el canal "messages" se guarda como delta:
+#los mensajes agregados desde la versión anterior, con un snapshot completo cada SNAPSHOT_EVERY pasos.
+#Los hilos que no se usan en CHECKPOINT_TTL_SECONDS se borran.
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.types import TASKS
+
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "checkpoints.sqlite3")
+CHECKPOINT_TTL_SECONDS = float(os.getenv("CHECKPOINT_TTL_SECONDS", str(7 * 24 * 3600)))
+EVICT_INTERVAL_SECONDS = 600
+SNAPSHOT_EVERY = 50
+DELTA_CHANNELS = ("messages",)
+COMPRESS_THRESHOLD = 1024
+LAST_MESSAGES_CACHE_SIZE = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT, type TEXT NOT NULL, checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL, metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, channel TEXT NOT NULL, version TEXT NOT NULL,
+    kind TEXT NOT NULL, base_version TEXT, depth INTEGER NOT NULL DEFAULT 0, type TEXT, blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL, idx INTEGER NOT NULL, channel TEXT NOT NULL, type TEXT NOT NULL,
+    blob BLOB NOT NULL, task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY, last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS threads_last_access ON threads (last_access);
+"""
+
+
+def _same_prefix(previous: list, current: list) -> bool:
+    if len(previous) > len(current):
+        return False
+    return all(a is b or a == b for a, b in zip(previous, current))
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver):
+    """
+    Guarda los checkpoints del grafo en SQLite para que las conversaciones sobrevivan reinicios
+    sin que la memoria del proceso crezca con cada turno.
+
+    Args:
+        path (str): Ruta del archivo SQLite.
+        ttl_seconds (float | None): Hilos sin actividad por más de este tiempo se borran; None desactiva la expiración.
+        snapshot_every (int): Largo máximo de la cadena de deltas de mensajes antes de guardar la lista completa.
+        serde: Serializador de LangGraph (por defecto JsonPlusSerializer, que usa msgpack).
+    """
+
+    def __init__(self, path: str = CHECKPOINT_DB_PATH, ttl_seconds=CHECKPOINT_TTL_SECONDS,
+                 snapshot_every: int = SNAPSHOT_EVERY, serde=None):
+        super().__init__(serde=serde)
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+        #(thread_id, ns, canal) -> (versión, profundidad, lista de mensajes) del último put, para calcular el delta
+        self._last_messages = OrderedDict()
+        self._last_eviction = 0.0
+
+    # -------------------- Serialización --------------------
+    def _dump(self, value):
+        type_, data = self.serde.dumps_typed(value)
+        if len(data) > COMPRESS_THRESHOLD:
+            return "z:" + type_, zlib.compress(data)
+        return type_, data
+
+    def _load(self, type_, data):
+        if type_.startswith("z:"):
+            return self.serde.loads_typed((type_[2:], zlib.decompress(data)))
+        return self.serde.loads_typed((type_, data))
+
+    # -------------------- Blobs de canales --------------------
+    def _remember_messages(self, key, version, depth, messages):
+        self._last_messages[key] = (version, depth, list(messages))
+        self._last_messages.move_to_end(key)
+        while len(self._last_messages) > LAST_MESSAGES_CACHE_SIZE:
+            self._last_messages.popitem(last=False)
+
+    def _blob_row(self, thread_id, checkpoint_ns, channel, version, values):
+        if channel not in values:
+            return (thread_id, checkpoint_ns, channel, version, "empty", None, 0, None, None)
+        value = values[channel]
+        if channel in DELTA_CHANNELS and isinstance(value, list):
+            key = (thread_id, checkpoint_ns, channel)
+            previous = self._last_messages.get(key)
+            self._remember_messages(key, version, 0, value)
+            if previous is not None:
+                base_version, depth, base_messages = previous
+                if depth + 1 < self.snapshot_every and _same_prefix(base_messages, value):
+                    self._remember_messages(key, version, depth + 1, value)
+                    type_, data = self._dump(value[len(base_messages):])
+                    return (thread_id, checkpoint_ns, channel, version, "delta", base_version, depth + 1, type_, data)
+        type_, data = self._dump(value)
+        return (thread_id, checkpoint_ns, channel, version, "full", None, 0, type_, data)
+
+    def _load_channel(self, thread_id, checkpoint_ns, channel, version):
+        """Devuelve (encontrado, valor, profundidad) reconstruyendo la cadena de deltas si hace falta."""
+        deltas = []
+        depth = None
+        while True:
+            row = self._db.execute(
+                "SELECT kind, base_version, depth, type, blob FROM blobs "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, version),
+            ).fetchone()
+            if row is None:
+                return False, None, 0
+            kind, base_version, row_depth, type_, data = row
+            if depth is None:
+                depth = row_depth
+            if kind == "empty":
+                return False, None, 0
+            if kind == "full":
+                value = self._load(type_, data)
+                break
+            deltas.append(self._load(type_, data))
+            version = base_version
+        for delta in reversed(deltas):
+            value = value + delta
+        return True, value, depth
+
+    def _load_channels(self, thread_id, checkpoint_ns, versions, remember=False):
+        values = {}
+        for channel, version in versions.items():
+            found, value, depth = self._load_channel(thread_id, checkpoint_ns, channel, version)
+            if not found:
+                continue
+            values[channel] = value
+            if remember and channel in DELTA_CHANNELS and isinstance(value, list):
+                self._remember_messages((thread_id, checkpoint_ns, channel), version, depth, value)
+        return values
+
+    # -------------------- Lectura --------------------
+    def _pending_sends(self, thread_id, checkpoint_ns, parent_checkpoint_id):
+        if not parent_checkpoint_id:
+            return []
+        rows = self._db.execute(
+            "SELECT type, blob FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "AND channel = ? ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, parent_checkpoint_id, TASKS),
+        ).fetchall()
+        return [self._load(type_, data) for type_, data in rows]
+
+    def _to_tuple(self, row, remember=False):
+        (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+         type_, checkpoint_data, metadata_type, metadata_data) = row
+        checkpoint = self._load(type_, checkpoint_data)
+        writes = self._db.execute(
+            "SELECT task_id, channel, type, blob FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id,
+            }},
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_channels(
+                    thread_id, checkpoint_ns, checkpoint["channel_versions"], remember=remember
+                ),
+                "pending_sends": self._pending_sends(thread_id, checkpoint_ns, parent_checkpoint_id),
+            },
+            metadata=self._load(metadata_type, metadata_data),
+            parent_config=(
+                {"configurable": {
+                    "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_checkpoint_id,
+                }}
+                if parent_checkpoint_id else None
+            ),
+            pending_writes=[(task_id, channel, self._load(t, data)) for task_id, channel, t, data in writes],
+        )
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        columns = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                   "metadata_type, metadata FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?")
+        with self._lock:
+            if checkpoint_id:
+                row = self._db.execute(columns + " AND checkpoint_id = ?",
+                                       (thread_id, checkpoint_ns, checkpoint_id)).fetchone()
+            else:
+                row = self._db.execute(columns + " ORDER BY checkpoint_id DESC LIMIT 1",
+                                       (thread_id, checkpoint_ns)).fetchone()
+            if row is None:
+                return None
+            #El último checkpoint se deja en cache para que el próximo put pueda guardar solo el delta
+            return self._to_tuple(row, remember=not checkpoint_id)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                 "metadata_type, metadata FROM checkpoints")
+        conditions, params = [], []
+        if config:
+            conditions.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                conditions.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                conditions.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            conditions.append("checkpoint_id < ?")
+            params.append(before_id)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            with self._lock:
+                checkpoint_tuple = self._to_tuple(row)
+            if filter and not all(checkpoint_tuple.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield checkpoint_tuple
+
+    # -------------------- Escritura --------------------
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        stored = checkpoint.copy()
+        stored.pop("pending_sends", None)
+        values = stored.pop("channel_values")
+        type_, data = self._dump(stored)
+        metadata_type, metadata_data = self._dump(get_checkpoint_metadata(config, metadata))
+        with self._lock:
+            blob_rows = [
+                self._blob_row(thread_id, checkpoint_ns, channel, version, values)
+                for channel, version in new_versions.items()
+            ]
+            self._db.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", blob_rows)
+            self._db.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 type_, data, metadata_type, metadata_data),
+            )
+            self._db.execute("INSERT OR REPLACE INTO threads VALUES (?, ?)", (thread_id, time.time()))
+            self._db.commit()
+        self._maybe_evict()
+        return {"configurable": {
+            "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"],
+        }}
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        #Las escrituras especiales (errores, interrupciones) se reemplazan; las normales no se duplican
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, data = self._dump(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id,
+                         WRITES_IDX_MAP.get(channel, idx), channel, type_, data, task_path))
+        with self._lock:
+            self._db.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def delete_thread(self, thread_id):
+        with self._lock:
+            for table in ("checkpoints", "blobs", "writes", "threads"):
+                self._db.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._db.commit()
+            for key in [key for key in self._last_messages if key[0] == thread_id]:
+                del self._last_messages[key]
+
+    def evict_idle(self, ttl_seconds=None) -> int:
+        """Borra los hilos sin actividad por más de ttl_seconds. Devuelve cuántos se borraron."""
+        ttl_seconds = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl_seconds is None:
+            return 0
+        with self._lock:
+            idle = [row[0] for row in self._db.execute(
+                "SELECT thread_id FROM threads WHERE last_access < ?", (time.time() - ttl_seconds,)
+            ).fetchall()]
+        for thread_id in idle:
+            self.delete_thread(thread_id)
+        return len(idle)
+
+    def _maybe_evict(self):
+        now = time.monotonic()
+        if self.ttl_seconds is None or now - self._last_eviction < EVICT_INTERVAL_SECONDS:
+            return
+        self._last_eviction = now
+        evicted = self.evict_idle()
+        if evicted:
+            with self._lock:
+                self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def get_next_version(self, current, channel):
+        #Mismo formato que MemorySaver: número creciente + sufijo aleatorio
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # -------------------- API async (el grafo corre con ainvoke) --------------------
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        tuples = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in tuples:
+            yield checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
@@ -0,0 +1,208 @@
+#Jobs en segundo plano para generar embeddings de un label completo.
+#Cada lote manda todas sus descripciones en un solo request de embeddings y las escribe con un UNWIND.
+#El progreso se guarda en un archivo JSON despues de cada lote para poder reanudar el job.
+#No hay cursor: cada lote toma los primeros nodos que siguen sin embedding, y los ya escritos salen solos del filtro.
+import json
+import os
+import threading
+import time
+
+EMBEDDING_JOBS_PATH = os.getenv("EMBEDDING_JOBS_PATH", "embedding_jobs.json")
+DEFAULT_BATCH_SIZE = 100
+#La API de embeddings acepta como máximo 2048 textos por request
+MAX_BATCH_SIZE = 2048
+
+FETCH_BATCH_QUERY = """
+MATCH (n:{label})
+WHERE n.embedding IS NULL AND n.description IS NOT NULL AND n.description <> ''
+RETURN elementId(n) AS id, n.description AS description
+LIMIT $limit
+"""
+
+WRITE_BATCH_QUERY = """
+UNWIND $rows AS row
+MATCH (n) WHERE elementId(n) = row.id
+SET n.embedding = row.embedding
+"""
+
+REMAINING_QUERY = """
+MATCH (n:{label})
+WHERE n.embedding IS NULL AND n.description IS NOT NULL AND n.description <> ''
+RETURN count(n) AS remaining
+"""
+
+SKIPPED_QUERY = """
+MATCH (n:{label})
+WHERE n.embedding IS NULL AND (n.description IS NULL OR n.description = '')
+RETURN count(n) AS skipped
+"""
+
+
+class EmbeddingJob:
+    """
+    Genera los embeddings que faltan para un label, por lotes, en un hilo aparte.
+
+    Args:
+        driver: Driver síncrono de Neo4j.
+        embeddings: EmbeddingService usado para pedir los vectores.
+        label (str): Label de los nodos a procesar.
+        batch_size (int): Nodos por lote.
+        checkpoint (dict | None): Estado guardado de una ejecución anterior.
+        on_progress (callable | None): Se llama con el job después de cada lote.
+        on_batch (callable | None): Se llama con los elementId escritos en cada lote.
+    """
+
+    def __init__(self, driver, embeddings, label, batch_size=DEFAULT_BATCH_SIZE, checkpoint=None, on_progress=None,
+                 on_batch=None):
+        checkpoint = checkpoint or {}
+        self.driver = driver
+        self.embeddings = embeddings
+        self.label = label
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+        self.on_batch = on_batch
+        self.updated = checkpoint.get("updated", 0)
+        self.skipped = checkpoint.get("skipped", 0)
+        self.batches = checkpoint.get("batches", 0)
+        self.status = "pending"
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self._updated_at_start = self.updated
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self):
+        self.status = "running"
+        self.started_at = time.time()
+        try:
+            with self.driver.session() as session:
+                #Los nodos sin descripción nunca reciben embedding: se cuentan una vez y el filtro los excluye
+                self.skipped = session.run(SKIPPED_QUERY.format(label=self.label)).single()["skipped"]
+                previous_ids = None
+                while True:
+                    rows = session.run(FETCH_BATCH_QUERY.format(label=self.label), limit=self.batch_size).data()
+                    if not rows:
+                        break
+                    ids = [row["id"] for row in rows]
+                    if ids == previous_ids:
+                        raise RuntimeError("The last batch was not written; stopping to avoid looping over it")
+                    previous_ids = ids
+                    vectors = self.embeddings.embed_many([row["description"] for row in rows])
+                    session.run(
+                        WRITE_BATCH_QUERY,
+                        rows=[{"id": row["id"], "embedding": vector} for row, vector in zip(rows, vectors)],
+                    ).consume()
+                    if self.on_batch:
+                        self.on_batch(ids)
+                    self.updated += len(rows)
+                    self.batches += 1
+                    if self.on_progress:
+                        self.on_progress(self)
+            self.status = "completed"
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+        finally:
+            self.finished_at = time.time()
+            if self.on_progress:
+                self.on_progress(self)
+
+    def remaining(self):
+        with self.driver.session() as session:
+            record = session.run(REMAINING_QUERY.format(label=self.label)).single()
+            return record["remaining"] if record else 0
+
+    def checkpoint(self):
+        return {
+            "label": self.label,
+            "updated": self.updated,
+            "skipped": self.skipped,
+            "batches": self.batches,
+            "status": self.status,
+            "error": self.error,
+        }
+
+    def status_report(self):
+        report = self.checkpoint()
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        processed_now = self.updated - self._updated_at_start
+        report["batch_size"] = self.batch_size
+        report["elapsed_seconds"] = round(elapsed, 2)
+        report["nodes_per_second"] = round(processed_now / elapsed, 2) if elapsed else 0.0
+        try:
+            report["remaining"] = self.remaining()
+        except Exception:
+            #Neo4j no responde: el estado del job está en memoria, solo falta el conteo pendiente
+            pass
+        return report
+
+
+class EmbeddingJobManager:
+    """Lleva un job por label y persiste sus checkpoints en EMBEDDING_JOBS_PATH."""
+
+    def __init__(self, driver, embeddings, path=EMBEDDING_JOBS_PATH, on_batch=None):
+        self.driver = driver
+        self.embeddings = embeddings
+        self.on_batch = on_batch
+        self.path = path
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def _load_checkpoints(self):
+        if not os.path.isfile(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_checkpoint(self, job):
+        with self._lock:
+            checkpoints = self._load_checkpoints()
+            checkpoints[job.label] = job.checkpoint()
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(checkpoints, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def start(self, label, batch_size=DEFAULT_BATCH_SIZE):
+        """Arranca (o reanuda desde su checkpoint) el job del label. Si ya corre, devuelve el existente."""
+        batch_size = min(batch_size, MAX_BATCH_SIZE)
+        with self._lock:
+            job = self.jobs.get(label)
+            if job and job.is_running():
+                return job
+            checkpoint = self._load_checkpoints().get(label)
+            if checkpoint and checkpoint.get("status") == "completed":
+                checkpoint = None
+            job = EmbeddingJob(
+                self.driver, self.embeddings, label, batch_size=batch_size,
+                checkpoint=checkpoint, on_progress=self._save_checkpoint, on_batch=self.on_batch,
+            )
+            self.jobs[label] = job
+        return job.start()
+
+    def get(self, label):
+        with self._lock:
+            job = self.jobs.get(label)
+            if job is not None:
+                return job
+            checkpoint = self._load_checkpoints().get(label)
+        if checkpoint is None:
+            return None
+        job = EmbeddingJob(self.driver, self.embeddings, label, checkpoint=checkpoint)
+        job.status = checkpoint.get("status", "pending")
+        if job.status == "running":
+            #Quedó corriendo cuando se cortó el proceso: ya no hay hilo, se reanuda con start()
+            job.status = "interrupted"
+        job.error = checkpoint.get("error")
+        return job
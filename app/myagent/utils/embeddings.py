@@ -0,0 +1,155 @@
+#Servicio de embeddings compartido por todos los puntos que llaman a client.embeddings.create.
+#Los vectores se guardan en un LRU en memoria y en un SQLite en disco para que sobrevivan reinicios.
+#La llave es (modelo, dimensiones, sha256 del texto normalizado).
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embeddings_cache.sqlite3")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza unicode y espacios para que variaciones triviales compartan entrada en la cache."""
+    text = unicodedata.normalize("NFC", text)
+    return " ".join(text.split())
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingService:
+    """
+    Envuelve el cliente de OpenAI y cachea embeddings por contenido.
+
+    Args:
+        client: Cliente OpenAI ya configurado.
+        client_factory (callable | None): Alternativa a client; crea el cliente recién en el primer miss.
+        model (str): Modelo de embeddings.
+        dimensions (int | None): Dimensiones pedidas al modelo, None usa las del modelo.
+        cache_path (str | None): Ruta del SQLite en disco, None desactiva la persistencia.
+        max_entries (int): Tamaño máximo del LRU en memoria.
+    """
+
+    def __init__(self, client=None, model: str = EMBEDDING_MODEL, dimensions: Optional[int] = None,
+                 cache_path: Optional[str] = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_SIZE,
+                 client_factory=None):
+        self._client = client
+        self._client_factory = client_factory
+        self.model = model
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db = None
+        if cache_path:
+            self._db = sqlite3.connect(cache_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, dimensions INTEGER NOT NULL, text_hash TEXT NOT NULL, "
+                "vector BLOB NOT NULL, PRIMARY KEY (model, dimensions, text_hash))"
+            )
+            self._db.commit()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    def _key(self, text: str):
+        return (self.model, self.dimensions or 0, text_key(text))
+
+    def _get_cached(self, key):
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return vector
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT vector FROM embeddings WHERE model = ? AND dimensions = ? AND text_hash = ?", key
+            ).fetchone()
+        if row is None:
+            return None
+        vector = array("f", row[0]).tolist()
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, vector)
+        return vector
+
+    def _remember(self, key, vector):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _store(self, pairs):
+        with self._lock:
+            for key, vector in pairs:
+                self._remember(key, vector)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, dimensions, text_hash, vector) VALUES (?, ?, ?, ?)",
+                    [(*key, array("f", vector).tobytes()) for key, vector in pairs],
+                )
+                self._db.commit()
+
+    def _create(self, texts):
+        kwargs = {"input": texts, "model": self.model}
+        if self.dimensions:
+            kwargs["dimensions"] = self.dimensions
+        response = self.client.embeddings.create(**kwargs)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def embed(self, text: str) -> list:
+        """Devuelve el embedding de un texto, consultando la API solo si no está en cache."""
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: list) -> list:
+        """
+        Devuelve los embeddings de varios textos en el mismo orden.
+        Los que no están en cache se piden a la API en un solo request.
+        """
+        keys = [self._key(text) for text in texts]
+        vectors = [self._get_cached(key) for key in keys]
+        pending = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                pending.setdefault(keys[i], []).append(i)
+        if pending:
+            with self._lock:
+                self.misses += len(pending)
+            first_index = [positions[0] for positions in pending.values()]
+            created = self._create([normalize_text(texts[i]) for i in first_index])
+            self._store(list(zip(pending.keys(), created)))
+            for positions, vector in zip(pending.values(), created):
+                for i in positions:
+                    vectors[i] = vector
+        return vectors
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "model": self.model,
+                "dimensions": self.dimensions,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._lru),
+            }
@@ -0,0 +1,144 @@
+#Revisión del grafo: número creciente que sube con cada escritura, compartido entre main_ws.py e import_relationships.py.
+#Las caches de lectura guardan la revisión con la que se llenaron y se invalidan solas cuando cambia.
+#Cada revisión queda en un log de cambios (SQLite en WAL) para que el frontend pida solo lo que cambió:
+#  node/link + upsert/delete -> cambio puntual, identificado como en /api/graph-data
+#  graph + reset             -> escritura que no se puede detallar (Cypher libre, importación); el cliente recarga todo
+#  embedding + upsert        -> nodo (elementId) que recibió embedding: invisible para la visualización,
+#                               pero el índice vectorial local lo relee
+#  graph + touch             -> cambio invisible sin detalle (p. ej. un índice nuevo); solo invalida caches
+#current() devuelve la revisión cacheada en el proceso y solo relee el log cuando PRAGMA data_version dice que cambió.
+import os
+import sqlite3
+import threading
+import time
+
+GRAPH_CHANGES_PATH = os.getenv(
+    "GRAPH_CHANGES_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "graph_changes.sqlite3"),
+)
+GRAPH_CHANGES_KEEP = int(os.getenv("GRAPH_CHANGES_KEEP", "50000"))
+TRIM_EVERY = 1000
+
+_lock = threading.Lock()
+_db = None
+#current() usa su propia conexión y su propio lock: en WAL lee sin esperar a que termine un commit del escritor
+_read_lock = threading.Lock()
+_reader = None
+_revision = 0
+_data_version = None
+
+
+def _connection():
+    global _db
+    if _db is None:
+        _db = sqlite3.connect(GRAPH_CHANGES_PATH, check_same_thread=False, timeout=10)
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.execute(
+            "CREATE TABLE IF NOT EXISTS changes ("
+            "rev INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, entity_id TEXT, "
+            "op TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        _db.commit()
+    return _db
+
+
+def _reader_connection():
+    global _reader
+    if _reader is None:
+        with _lock:
+            _connection()
+        _reader = sqlite3.connect(GRAPH_CHANGES_PATH, check_same_thread=False, timeout=10)
+    return _reader
+
+
+def current() -> int:
+    """
+    Revisión actual, servida desde memoria. PRAGMA data_version cambia cuando cualquier otra conexión
+    (el escritor de este proceso u otro proceso, p. ej. import_relationships.py) confirma algo;
+    solo entonces se vuelve a leer MAX(rev).
+    """
+    global _revision, _data_version
+    with _read_lock:
+        db = _reader_connection()
+        data_version = db.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != _data_version:
+            _revision = db.execute("SELECT MAX(rev) FROM changes").fetchone()[0] or 0
+            _data_version = data_version
+        return _revision
+
+
+def record(nodes=(), links=(), removed_nodes=(), removed_links=(), embedded=()) -> int:
+    """
+    Registra los cambios de una escritura y devuelve la nueva revisión.
+    Sin argumentos registra un "touch": sube la revisión sin cambios visibles.
+
+    Args:
+        nodes (iterable): IDs de nodos creados o modificados.
+        links (iterable): elementIds de relaciones creadas o modificadas.
+        removed_nodes (iterable): IDs de nodos borrados.
+        removed_links (iterable): elementIds de relaciones borradas.
+        embedded (iterable): elementIds de nodos a los que se les escribió el embedding.
+    Returns:
+        int: Revisión después del cambio.
+    """
+    now = time.time()
+    rows = (
+        [("node", str(entity_id), "upsert", now) for entity_id in nodes]
+        + [("link", str(entity_id), "upsert", now) for entity_id in links]
+        + [("node", str(entity_id), "delete", now) for entity_id in removed_nodes]
+        + [("link", str(entity_id), "delete", now) for entity_id in removed_links]
+        + [("embedding", str(entity_id), "upsert", now) for entity_id in embedded]
+    ) or [("graph", None, "touch", now)]
+    return _insert(rows)
+
+
+def bump() -> int:
+    """Marca un cambio que no se puede detallar: quien pida cambios desde antes tendrá que recargar el grafo."""
+    return _insert([("graph", None, "reset", time.time())])
+
+
+def _insert(rows) -> int:
+    with _lock:
+        db = _connection()
+        cursor = db.executemany("INSERT INTO changes (kind, entity_id, op, created) VALUES (?, ?, ?, ?)", rows)
+        revision = db.execute("SELECT MAX(rev) FROM changes").fetchone()[0]
+        if revision // TRIM_EVERY != (revision - cursor.rowcount) // TRIM_EVERY:
+            db.execute("DELETE FROM changes WHERE rev <= ?", (revision - GRAPH_CHANGES_KEEP,))
+        db.commit()
+    return revision
+
+
+def changes_since(since: int) -> dict:
+    """
+    Resume los cambios posteriores a la revisión since (el último cambio de cada entidad gana).
+
+    Returns:
+        dict: {"revision", "reset", "nodes", "links", "removed_nodes", "removed_links", "embedded"}.
+              reset es True si hubo un cambio no detallado o si el log ya no llega hasta since.
+    """
+    with _lock:
+        db = _connection()
+        revision, oldest = db.execute("SELECT MAX(rev), MIN(rev) FROM changes").fetchone()
+        rows = db.execute(
+            "SELECT kind, entity_id, op FROM changes WHERE rev > ? ORDER BY rev", (since,)
+        ).fetchall()
+    revision = revision or 0
+    summary = {"revision": revision, "reset": False, "nodes": [], "links": [], "removed_nodes": [], "removed_links": [],
+               "embedded": []}
+    if since > revision or (oldest is not None and since < oldest - 1):
+        summary["reset"] = True
+        return summary
+    latest = {}
+    for kind, entity_id, op in rows:
+        if op == "reset":
+            summary["reset"] = True
+            return summary
+        if op != "touch":
+            latest[(kind, entity_id)] = op
+    for (kind, entity_id), op in latest.items():
+        if kind == "embedding":
+            summary["embedded"].append(entity_id)
+            continue
+        key = ("removed_" if op == "delete" else "") + ("nodes" if kind == "node" else "links")
+        summary[key].append(entity_id)
+    return summary
@@ -1,88 +1,65 @@
 #make sure you have your api keys in the .env file.
+import asyncio
+import os
+from functools import lru_cache
+from importlib import import_module
 from dotenv import load_dotenv
-from langchain_deepseek import ChatDeepSeek
-from langchain_openai import ChatOpenAI
-from langchain_ollama import ChatOllama
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_together import ChatTogether
-from langchain_anthropic import ChatAnthropic
 load_dotenv()
 
-class Models:
-    @classmethod
-    def get_model(self,model_name,temperature=0,max_tokens=None,timeout=None,max_retries=3):
-        deepseek_v3=  ChatTogether(
-            model="deepseek-ai/DeepSeek-V3",
-            temperature=temperature,
-            max_tokens=max_tokens,
-            timeout=timeout,
-            max_retries=max_retries,
-        )
-        deepseek_r1 = ChatDeepSeek(
-            model="deepseek-reasoner",
-            temperature=temperature,
-            max_tokens=max_tokens,
-            timeout=timeout,
-            max_retries=max_retries
-        )
+#Tiempo máximo (segundos) de cada llamada al LLM desde el event loop del websocket
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "60"))
 
-        gpt4omini = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=temperature,
-            max_tokens=max_tokens,
-            timeout=timeout,
-            max_retries=max_retries
-        )
-
-        gpt4o = ChatOpenAI(
-            model="gpt-4o",
-            temperature=temperature,
-            max_tokens=max_tokens,
-            timeout=timeout,
-            max_retries=max_retries
-        )
+#Registro de modelos: nombre -> (módulo del proveedor, clase, argumentos fijos, acepta temperature/max_tokens/...).
+#El SDK de cada proveedor solo se importa la primera vez que se pide uno de sus modelos.
+MODEL_REGISTRY = {
+    "deepseek-chat": ("langchain_together", "ChatTogether", {"model": "deepseek-ai/DeepSeek-V3"}, True),
+    "deepseek-reasoner": ("langchain_deepseek", "ChatDeepSeek", {"model": "deepseek-reasoner"}, True),
+    "gpt-4o-mini": ("langchain_openai", "ChatOpenAI", {"model": "gpt-4o-mini"}, True),
+    "gpt-4o": ("langchain_openai", "ChatOpenAI", {"model": "gpt-4o"}, True),
+    "gemini-2.0-flash": ("langchain_google_genai", "ChatGoogleGenerativeAI", {"model": "gemini-2.0-flash"}, True),
+    "gemini-lite": ("langchain_google_genai", "ChatGoogleGenerativeAI", {"model": "gemini-2.0-flash-lite"}, True),
+    "learnlm": ("langchain_google_genai", "ChatGoogleGenerativeAI", {"model": "learnlm-1.5-pro-experimental"}, True),
+    "claude_model": ("langchain_anthropic", "ChatAnthropic", {"model": "claude-3-5-sonnet-20241022"}, False),
+}
 
-        gemini_flash = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            temperature=temperature,
-            max_tokens=max_tokens,
-            timeout=timeout,
-            max_retries=max_retries,
-        )
-        gemini_lite = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-lite",
-            temperature=temperature,
-            max_tokens=max_tokens,
-            timeout=timeout,
-            max_retries=max_retries,
-        )
-        claude_model = ChatAnthropic(model="claude-3-5-sonnet-20241022")
 
-        learnlm = ChatGoogleGenerativeAI(
-            model="learnlm-1.5-pro-experimental",
+@lru_cache(maxsize=None)
+def _build_model(model_name, temperature, max_tokens, timeout, max_retries):
+    module_name, class_name, fixed_kwargs, tunable = MODEL_REGISTRY[model_name]
+    model_class = getattr(import_module(module_name), class_name)
+    kwargs = dict(fixed_kwargs)
+    if tunable:
+        kwargs.update(
             temperature=temperature,
             max_tokens=max_tokens,
             timeout=timeout,
             max_retries=max_retries,
         )
-
-        available_models = {
-            "deepseek-chat": deepseek_v3,
-            "deepseek-reasoner": deepseek_r1,
-            "gpt-4o-mini": gpt4omini,
-            "gpt-4o": gpt4o,
-            "gemini-2.0-flash": gemini_flash,
-            "claude_model": claude_model,
-            "learnlm": learnlm,
-            "deepseek-v3-sambanova": deepseek_v3_sambanova,
-            "gemini-lite": gemini_lite,
-        }
-
-        return available_models[model_name]
-
-
+    return model_class(**kwargs)
 
 
+class Models:
+    @classmethod
+    def get_model(self,model_name,temperature=0,max_tokens=None,timeout=None,max_retries=3):
+        """
+        Devuelve el modelo pedido, construyéndolo solo la primera vez.
+        Las instancias se reutilizan por (nombre, temperature, max_tokens, timeout, max_retries).
+        """
+        if model_name not in MODEL_REGISTRY:
+            raise KeyError(f"Unknown model '{model_name}'. Available: {', '.join(MODEL_REGISTRY)}")
+        return _build_model(model_name, temperature, max_tokens, timeout, max_retries)
 
 
+async def ainvoke_with_timeout(model, messages, timeout=None):
+    """
+    Llama a model.ainvoke sin bloquear el event loop.
+    Si pasa el timeout (o la tarea que espera se cancela), la llamada en curso se cancela y se lanza TimeoutError/CancelledError.
 
+    Args:
+        model: Modelo de langchain (Models.get_model).
+        messages (list): Mensajes a enviar.
+        timeout (float | None): Segundos; None usa LLM_CALL_TIMEOUT.
+    Returns:
+        AIMessage: Respuesta del modelo.
+    """
+    return await asyncio.wait_for(model.ainvoke(messages), timeout or LLM_CALL_TIMEOUT)
@@ -7,14 +7,15 @@ from .state import OverallState
 from langchain_core.runnables import RunnableConfig,RunnableLambda
 from langgraph.store.base import BaseStore
 from .configuration import Configuration as conf
-from .models import Models
+from .models import Models, ainvoke_with_timeout
 from . import tools
 from . import prompts
-from langchain_core.messages import SystemMessage, HumanMessage,ToolMessage
+from .retrieval import astream_vector_search
+from langchain_core.messages import SystemMessage, HumanMessage,ToolMessage,AIMessage,RemoveMessage
 from langgraph.prebuilt import ToolNode
 from langgraph.types import Command
 import re
-import json
+import asyncio
 
 #---------------Utils
 def print_colored(text, color_code):
@@ -31,50 +32,78 @@ def unwrap_memory_query(texto):
     
     return None, None
 
-def vector_search_nodes(type:str,query_text:str,k:int,driver,client):
+async def vector_search_nodes(type:str,query_text:str,k:int,driver,embeddings,local_index=None):
     if type == "episodic":
         indexName = "episodic_index"
     elif type == "semantic":
         indexName = "semantic_index"
 
 
-    openai_response = client.embeddings.create(
-        input=query_text,
-        model="text-embedding-3-small"
-    )
-    queryVector = openai_response.data[0].embedding
-    query = f"""
-    CALL db.index.vector.queryNodes('{indexName}', {k}, {json.dumps(queryVector)})
-    YIELD node, score
-    RETURN node, score
-    """
     try:
-        with driver.session() as session:
-            result = session.run(query)
-            records = [record.data() for record in result]
-            resultados= []
-            for record in records:
-                node = record["node"]
-                node_copy = dict(node)
-                if "embedding" in node_copy:
-                    del node_copy["embedding"]
-        
-                resultados.append(node_copy)
+        #Un miss de cache es un request HTTP a OpenAI: se hace en un hilo para no frenar el loop
+        queryVector = await asyncio.to_thread(embeddings.embed, query_text)
+        #Si el índice local ya está cargado se evita el viaje a Neo4j; si está frío, Neo4j responde.
+        if local_index is not None and local_index.has_index(indexName):
+            records = local_index.search(indexName, queryVector, k)
+        else:
+            records = [record async for record in astream_vector_search(driver, indexName, k, queryVector)]
+        resultados = [record["node"] for record in records]
         return {"results": resultados}
     except Exception as e:
         return {"error": f"Error executing vector search: {str(e)}"}
 
 PRINCIPAL_MODEL_NAME="gemini-2.0-flash"
 print_colored(f"Using model: {PRINCIPAL_MODEL_NAME}", 32)
-model_with_tools= Models.get_model(PRINCIPAL_MODEL_NAME)
+def get_model_with_tools():
+    #El modelo se construye en la primera llamada (Models lo memoiza), no al importar el grafo
+    return Models.get_model(PRINCIPAL_MODEL_NAME)
+
+
+#Memoria de trabajo acotada: al pasar SUMMARY_TRIGGER_MESSAGES mensajes, los más viejos se resumen
+#y se quitan del estado, dejando solo los últimos RECENT_MESSAGES.
+SUMMARY_TRIGGER_MESSAGES = 8
+RECENT_MESSAGES = 4
+
+def format_history(messages) -> str:
+    lines = []
+    for msg in messages:
+        if msg.type == "human":
+            lines.append(f"User: {msg.content}")
+        elif msg.type == "ai":
+            lines.append(f"Asistente: {msg.content}")
+        elif msg.type == "tool":
+            lines.append(f"ToolCall: {msg.content}")
+    return "\n".join(lines)
 
+async def summarize_conversation(state: OverallState) -> dict:
+    messages = state["messages"]
+    if len(messages) <= SUMMARY_TRIGGER_MESSAGES:
+        return {}
+    old_messages = messages[:-RECENT_MESSAGES]
+    previous_summary = state.get("summary", "")
+    history = f"Resumen previo: {previous_summary}\n{format_history(old_messages)}"
+    try:
+        response = await ainvoke_with_timeout(
+            get_model_with_tools(),
+            [SystemMessage(content=prompts.SUMMARIZE_CONVERSATION_SUMMARY), HumanMessage(content=history)],
+        )
+    except asyncio.TimeoutError:
+        #Si no se pudo resumir se deja el historial como está y se intenta en el próximo turno
+        print_colored("No se pudo resumir la conversación a tiempo", 31)
+        return {}
+    print_colored(f"Resumidos {len(old_messages)} mensajes antiguos", 32)
+    return {
+        "summary": response.content,
+        "messages": [RemoveMessage(id=msg.id) for msg in old_messages],
+    }
 
 async def dig_into_memories(state: OverallState)-> dict:
     conversation_summary = []
     messages= state["messages"]
     sys_prompt= prompts.MAIN_AGENT_SYS_PROMPT
-    #Aca falta el resumen de la conversación,si es que hay más de 4 mensajes.
-    for msg in messages[-4:]:
+    if state.get("summary"):
+        conversation_summary.append(f"Resumen de lo anterior: {state['summary']}")
+    for msg in messages[-RECENT_MESSAGES:]:
         if msg.type == "human":
             conversation_summary.append(f"Input: {msg.content}")
         elif msg.type == "ai":
@@ -96,17 +125,22 @@ async def dig_into_memories(state: OverallState)-> dict:
         >Historial de la conversación: {conversation_summary}
         >Informacion de trabajo: {informacion_trabajo}
     """
-    response= model_with_tools.invoke([SystemMessage(content=sys_prompt),HumanMessage(content=str(input_prompt))])
+    try:
+        response= await ainvoke_with_timeout(get_model_with_tools(),[SystemMessage(content=sys_prompt),HumanMessage(content=str(input_prompt))])
+    except asyncio.TimeoutError:
+        print_colored("El modelo no respondió a tiempo", 31)
+        response = AIMessage(content="Lo siento, estoy tardando demasiado en responder. ¿Puedes intentarlo de nuevo?")
     return {"messages": response}
 
 
-def dig_into_memories_tool_condition(state: OverallState) -> Literal["tools2", "__end__"]:
+async def analazing_next_node(state: OverallState, config: RunnableConfig) -> dict:
 
     messages = state["messages"]
     ai_message = messages[-1]
     configurable = config["configurable"]
     driver = configurable["driver"]
-    client = configurable["client"]
+    embeddings = configurable["embeddings"]
+    local_index = configurable.get("local_index")
     print_colored(f"Analizing next node...", 32)
     memory_type,query = unwrap_memory_query(ai_message.content)
     if memory_type and query:
@@ -115,7 +149,7 @@ def dig_into_memories_tool_condition(state: OverallState) -> Literal["tools2", "
         print_colored(f"Query: {query}", 32)
         #Performar la búsqueda vectorial
         k = 5
-        results = vector_search_nodes(memory_type,query,k,driver,client)
+        results = await vector_search_nodes(memory_type,query,k,driver,embeddings,local_index)
         if results:
             print_colored(f"Results: {results}", 32)
             return{
@@ -127,7 +161,7 @@ def dig_into_memories_tool_condition(state: OverallState) -> Literal["tools2", "
         "n_node": "__end__"
     }
     
-def dig_into_memories_tool_condition(state: OverallState):
+def dig_into_memories_tool_condition(state: OverallState) -> Literal["dig_into_memories", "__end__"]:
     next_node = state["n_node"]
     print_colored(f"Next node: {next_node}", 32)
     return next_node
@@ -129,9 +129,14 @@ POSTPROCESS_NODES_AND_RELATIONSHIPS_NAMES = """
 
 SUMMARIZE_CONVERSATION_SUMMARY = """
     Te llegara de input el historial de conversación, estructurado de la siguiente manera:
+    Resumen previo: El resumen que ya tenías de la conversación (puede estar vacío).
     User:Mensajes del usuario
     Asistente:Respuestas del asistente, 
-    ToolCall:
+    ToolCall:Llamadas a herramientas y sus resultados, si las hubo.
+    Tu tarea es devolver un único resumen actualizado que combine el resumen previo con los mensajes nuevos.
+    Conserva los datos importantes (nombre del estudiante, dudas planteadas, conceptos explicados, decisiones y pendientes),
+    en pocas oraciones y en español.
+    Devuelve solo el resumen, NADA MÁS.
 """
 
 #----------------------------------------3MEMORYBLOSCKSAPPROACH-----------------------------------
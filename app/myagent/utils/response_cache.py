@@ -0,0 +1,172 @@
+#Cache de respuestas HTTP de lectura, válida mientras no cambie la revisión del grafo.
+#Cada respuesta se serializa y comprime (gzip y, si está instalado, brotli) una sola vez por revisión,
+#y lleva un ETag fuerte para que los clientes que vuelven a preguntar reciban un 304 sin cuerpo.
+#Las respuestas en streaming se envían tal cual y se copian mientras salen; solo se guardan si la vista
+#marca su StreamResult como completo (un error a mitad del cuerpo nunca queda cacheado) y si no pasan de
+#RESPONSE_CACHE_MAX_BYTES; las más grandes se siguen enviando pero no se copian ni se guardan.
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+from . import graph_version
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "64"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+COMPRESS_MIN_BYTES = 1024
+
+
+class StreamResult:
+    """La vista lo adjunta a un Response en streaming (response.stream_result) y marca ok al terminar sin error."""
+
+    def __init__(self):
+        self.ok = False
+
+
+class CachedResponse:
+    def __init__(self, revision: int, body: bytes, mimetype: str):
+        self.revision = revision
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        #codificación -> cuerpo; "identity" siempre está
+        self.bodies = {"identity": body}
+        if len(body) >= COMPRESS_MIN_BYTES:
+            self.bodies["gzip"] = gzip.compress(body, compresslevel=6)
+            if brotli is not None:
+                self.bodies["br"] = brotli.compress(body)
+
+    def tag(self, encoding: str) -> str:
+        #Cada codificación es una representación distinta, así que lleva su propio ETag fuerte
+        return f'"{self.etag}"' if encoding == "identity" else f'"{self.etag}-{encoding}"'
+
+    def matches(self, if_none_match: str) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        tags = {self.tag(encoding) for encoding in self.bodies}
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return bool(tags & candidates)
+
+    def choose_encoding(self, accept_encoding: str) -> str:
+        accepted = {part.split(";")[0].strip().lower() for part in (accept_encoding or "").split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in self.bodies and encoding in accepted:
+                return encoding
+        return "identity"
+
+    def respond(self) -> Response:
+        encoding = self.choose_encoding(request.headers.get("Accept-Encoding", ""))
+        headers = {
+            "ETag": self.tag(encoding),
+            "Vary": "Accept-Encoding",
+            "Cache-Control": "no-cache",
+            "X-Graph-Revision": str(self.revision),
+        }
+        if self.matches(request.headers.get("If-None-Match", "")):
+            return Response(status=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(self.bodies[encoding], mimetype=self.mimetype, headers=headers)
+
+
+class ResponseCache:
+    """
+    LRU de respuestas por (ruta, argumentos). Una entrada sirve solo para la revisión con la que se armó.
+
+    Args:
+        max_entries (int): Respuestas guardadas como máximo.
+        max_bytes (int): Tamaño máximo (sin comprimir) de una respuesta para guardarla.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.oversized = 0
+
+    def get(self, key, revision):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.revision != revision:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "oversized": self.oversized,
+                "brotli_available": brotli is not None,
+            }
+
+    def _tee(self, key, revision, body, mimetype, result):
+        #Deja pasar el cuerpo sin demorarlo y lo guarda recién cuando terminó completo y sin error.
+        #Si pasa de max_bytes deja de copiarlo: la respuesta sale igual, pero no se cachea
+        chunks = []
+        size = 0
+        for chunk in body:
+            if chunks is not None:
+                size += len(chunk)
+                if size > self.max_bytes:
+                    chunks = None
+                    with self._lock:
+                        self.oversized += 1
+                else:
+                    chunks.append(chunk)
+            yield chunk
+        if result.ok and chunks is not None:
+            self.put(key, CachedResponse(revision, b"".join(chunks), mimetype))
+
+    def cached_by_revision(self, view):
+        """Decorador para rutas GET de Flask: solo las respuestas 200 completas y sin error se guardan."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            #La revisión se lee antes de consultar: si el grafo cambia mientras tanto, la entrada nace vieja y se rehace
+            revision = graph_version.current()
+            key = (request.path, tuple(sorted(request.args.items(multi=True))))
+            entry = self.get(key, revision)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                if response.is_streamed:
+                    result = getattr(response, "stream_result", None)
+                    if result is not None:
+                        response.response = self._tee(
+                            key, revision, response.iter_encoded(), response.mimetype, result
+                        )
+                    return response
+                body = response.get_data()
+                if len(body) > self.max_bytes:
+                    with self._lock:
+                        self.oversized += 1
+                    return response
+                entry = CachedResponse(revision, body, response.mimetype)
+                self.put(key, entry)
+            return entry.respond()
+        return wrapper
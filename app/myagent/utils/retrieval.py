@@ -0,0 +1,68 @@
+#Busqueda vectorial compartida por la API REST y por el agente.
+#El vector y k viajan como parametros para que Neo4j reutilice el plan de la consulta,
+#y el embedding se proyecta fuera en el servidor para no transferir los 1536 floats por nodo.
+
+VECTOR_PROPERTIES = ("embedding",)
+#Control interno de import_relationships.py --upsert: no es parte de la memoria y no se muestra
+IMPORT_PROPERTIES = ("app_id", "content_hash")
+IMPORT_LABEL = "Importado"
+INTERNAL_PROPERTIES = VECTOR_PROPERTIES + IMPORT_PROPERTIES
+
+VECTOR_SEARCH_QUERY = """
+CALL db.index.vector.queryNodes($index_name, $k, $query_vector)
+YIELD node, score
+RETURN node {.*, embedding: null} AS node, score
+"""
+
+
+def strip_internal_properties(properties: dict) -> dict:
+    return {key: value for key, value in properties.items() if key not in INTERNAL_PROPERTIES}
+
+
+def visible_labels(labels) -> list:
+    return [label for label in labels if label != IMPORT_LABEL]
+
+
+def strip_internal_values(value):
+    """Quita las propiedades internas de los nodos y mapas anidados en un resultado de Cypher (record.data())."""
+    if isinstance(value, dict):
+        return {key: strip_internal_values(item) for key, item in value.items() if key not in INTERNAL_PROPERTIES}
+    if isinstance(value, list):
+        return [strip_internal_values(item) for item in value]
+    return value
+
+
+def stream_vector_search(driver, index_name: str, k: int, query_vector: list):
+    """
+    Ejecuta db.index.vector.queryNodes y va devolviendo los registros a medida que llegan.
+
+    Args:
+        driver: Driver síncrono de Neo4j (rutas Flask).
+        index_name (str): Nombre del índice vectorial.
+        k (int): Número de vecinos.
+        query_vector (list): Vector de consulta.
+    Yields:
+        dict: {"node": propiedades sin embedding ni control de importación, "score": float}
+    """
+    with driver.session() as session:
+        result = session.run(VECTOR_SEARCH_QUERY, index_name=index_name, k=int(k), query_vector=query_vector)
+        for record in result:
+            yield {"node": strip_internal_properties(record["node"]), "score": record["score"]}
+
+
+async def astream_vector_search(driver, index_name: str, k: int, query_vector: list):
+    """
+    Igual que stream_vector_search pero con el AsyncDriver del agente, sin bloquear el event loop.
+
+    Args:
+        driver: AsyncDriver de Neo4j.
+        index_name (str): Nombre del índice vectorial.
+        k (int): Número de vecinos.
+        query_vector (list): Vector de consulta.
+    Yields:
+        dict: {"node": propiedades sin embedding ni control de importación, "score": float}
+    """
+    async with driver.session() as session:
+        result = await session.run(VECTOR_SEARCH_QUERY, index_name=index_name, k=int(k), query_vector=query_vector)
+        async for record in result:
+            yield {"node": strip_internal_properties(record["node"]), "score": record["score"]}
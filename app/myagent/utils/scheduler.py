@@ -0,0 +1,118 @@
+#Planificador de corridas del grafo: limita cuántas corren a la vez en todo el servidor
+#y mantiene una cola FIFO por sesión, para que los mensajes de una misma conversación no se pisen.
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+MAX_CONCURRENT_RUNS = int(os.getenv("MAX_CONCURRENT_RUNS", "8"))
+MAX_PENDING_PER_SESSION = int(os.getenv("MAX_PENDING_PER_SESSION", "4"))
+WAIT_SAMPLES = 256
+
+
+class SchedulerBusy(Exception):
+    """La sesión ya tiene demasiados mensajes esperando."""
+
+
+class _SessionQueue:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+        self.running = False
+
+
+class SessionScheduler:
+    """
+    Admisión de corridas: una a la vez por sesión y como máximo max_concurrent en total.
+
+    Args:
+        max_concurrent (int): Corridas del grafo en paralelo en todo el servidor.
+        max_pending_per_session (int): Mensajes de una sesión esperando o corriendo; el siguiente se rechaza.
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_RUNS,
+                 max_pending_per_session: int = MAX_PENDING_PER_SESSION):
+        self.max_concurrent = max_concurrent
+        self.max_pending_per_session = max_pending_per_session
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._sessions = {}
+        #stats() se llama desde los hilos de Flask, así que los contadores van con un lock de threading
+        self._stats_lock = threading.Lock()
+        self.running = 0
+        self.admitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+
+    async def run(self, session_id: str, coro_factory):
+        """
+        Espera turno para la sesión y ejecuta coro_factory().
+
+        Args:
+            session_id (str): Sesión (thread_id del checkpointer).
+            coro_factory (callable): Función sin argumentos que devuelve la corrutina a ejecutar.
+        Returns:
+            Lo que devuelva la corrutina.
+        Raises:
+            SchedulerBusy: Si la sesión ya tiene max_pending_per_session mensajes en cola.
+        """
+        with self._stats_lock:
+            queue = self._sessions.get(session_id)
+            if queue is None:
+                queue = self._sessions[session_id] = _SessionQueue()
+            if queue.pending >= self.max_pending_per_session:
+                self.rejected += 1
+                raise SchedulerBusy(f"Session '{session_id}' already has {queue.pending} pending messages")
+            queue.pending += 1
+        enqueued = time.monotonic()
+        try:
+            async with queue.lock:
+                async with self._semaphore:
+                    with self._stats_lock:
+                        self._waits.append(time.monotonic() - enqueued)
+                        self.admitted += 1
+                        self.running += 1
+                        queue.running = True
+                    try:
+                        result = await coro_factory()
+                    except Exception:
+                        with self._stats_lock:
+                            self.failed += 1
+                        raise
+                    finally:
+                        with self._stats_lock:
+                            self.running -= 1
+                            queue.running = False
+                    with self._stats_lock:
+                        self.completed += 1
+                    return result
+        finally:
+            with self._stats_lock:
+                queue.pending -= 1
+                if queue.pending == 0 and self._sessions.get(session_id) is queue:
+                    del self._sessions[session_id]
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            waits = sorted(self._waits)
+            queued_by_session = {
+                session_id: queue.pending - queue.running
+                for session_id, queue in self._sessions.items()
+            }
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_pending_per_session": self.max_pending_per_session,
+                "running": self.running,
+                "queue_depth": sum(queued_by_session.values()),
+                "queued_by_session": {k: v for k, v in queued_by_session.items() if v},
+                "active_sessions": len(self._sessions),
+                "admitted": self.admitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "wait_ms_avg": 1000 * sum(waits) / len(waits) if waits else 0.0,
+                "wait_ms_p95": 1000 * waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                "wait_ms_max": 1000 * waits[-1] if waits else 0.0,
+            }
@@ -0,0 +1,61 @@
+#Perfil de arranque: importa el módulo del servidor en un proceso nuevo con `python -X importtime`
+#y reporta cuánto tarda cada módulo, para que las regresiones de cold start sean visibles.
+import os
+import subprocess
+import sys
+import time
+
+
+def parse_importtime(stderr: str) -> list:
+    """Convierte la salida de -X importtime en [(modulo, self_us, cumulative_us)]."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+        except ValueError:
+            continue
+    return rows
+
+
+def profile_startup(script_path: str, top: int = 30) -> int:
+    """
+    Mide el costo de importar el script indicado (sin ejecutar su main) en un intérprete limpio.
+
+    Args:
+        script_path (str): Ruta del script, p. ej. main_ws.py.
+        top (int): Cuántos módulos mostrar, ordenados por tiempo acumulado.
+    Returns:
+        int: Código de salida del proceso hijo.
+    """
+    directory = os.path.dirname(os.path.abspath(script_path))
+    module = os.path.splitext(os.path.basename(script_path))[0]
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=directory,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    rows = parse_importtime(completed.stderr)
+    top_level = {}
+    for name, self_us, _ in rows:
+        root = name.lstrip().split(".")[0]
+        top_level[root] = top_level.get(root, 0) + self_us
+
+    print(f"Arranque de {module}: {wall:.2f}s de reloj, {len(rows)} módulos importados")
+    print(f"\n{'cumulative [ms]':>16} {'self [ms]':>10}  módulo")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[2], reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:16.1f} {self_us / 1000:10.1f}  {name}")
+    print(f"\n{'total [ms]':>16}  paquete")
+    for root, self_us in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"{self_us / 1000:16.1f}  {root}")
+    if completed.returncode != 0:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+        print("\nEl import falló:\n" + "\n".join(errors[-20:]))
+    return completed.returncode
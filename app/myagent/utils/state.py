@@ -15,6 +15,8 @@ class OverallState(MessagesState):
     #We can add more attributes here
     n_node:str
     informacion_trabajo: str
+    #Resumen acumulado de los turnos que ya se sacaron de "messages"
+    summary: str
 
 
 
@@ -0,0 +1,79 @@
+#Respuestas en streaming: traduce los eventos de LangGraph (astream_events v2) en frames del websocket.
+#  {"progress": {"stage": ...}}        -> cada nodo que empieza y cada salto a la memoria ("memory_hop")
+#  {"AI_delta": "...", "stream_id": id} -> tokens de la respuesta del agente a medida que llegan
+#  {"AI": "..."}                        -> la respuesta final completa, igual que sin streaming
+import json
+
+ANSWER_NODE = "dig_into_memories"
+ROUTER_NODE = "analazing_next_node"
+PROGRESS_NODES = ("summarize_conversation", "dig_into_memories", "analazing_next_node")
+#Los bloques de consulta a memoria empiezan con una de estas cercas; lo que viene después no se muestra
+MEMORY_FENCES = ("```", "´´´")
+
+
+def chunk_text(chunk) -> str:
+    content = getattr(chunk, "content", "")
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+
+def visible_prefix(text: str) -> tuple:
+    """
+    Devuelve (parte mostrable, encontró cerca).
+    Se retienen los últimos caracteres si pueden ser el inicio de una cerca partida entre tokens.
+    """
+    positions = [text.find(fence) for fence in MEMORY_FENCES if fence in text]
+    if positions:
+        return text[:min(positions)], True
+    held = 0
+    for fence in MEMORY_FENCES:
+        for size in range(len(fence) - 1, 0, -1):
+            if text.endswith(fence[:size]):
+                held = max(held, size)
+                break
+    return text[:len(text) - held], False
+
+
+async def stream_reply(graph, inputs: dict, config: dict, send) -> str:
+    """
+    Corre el grafo con astream_events y va enviando progreso y tokens por el websocket.
+
+    Args:
+        graph: Grafo compilado.
+        inputs (dict): Entrada del grafo (mensaje del usuario e informacion_trabajo).
+        config (dict): Config de la corrida (thread_id, websocket, driver, ...).
+        send: Corrutina send(texto) del websocket.
+    Returns:
+        str: Respuesta final del asistente.
+    """
+    texts = {}
+    sent = {}
+    fenced = set()
+    hop = 0
+    async for event in graph.astream_events(inputs, config, version="v2"):
+        kind = event["event"]
+        node = event.get("metadata", {}).get("langgraph_node")
+        if kind == "on_chat_model_stream" and node == ANSWER_NODE:
+            run_id = event["run_id"]
+            if run_id in fenced:
+                continue
+            texts[run_id] = texts.get(run_id, "") + chunk_text(event["data"]["chunk"])
+            visible, has_fence = visible_prefix(texts[run_id])
+            if has_fence:
+                fenced.add(run_id)
+            delta = visible[sent.get(run_id, 0):]
+            if delta:
+                sent[run_id] = len(visible)
+                await send(json.dumps({"AI_delta": delta, "stream_id": run_id}, ensure_ascii=False))
+        elif kind == "on_chain_start" and event["name"] == node and node in PROGRESS_NODES:
+            await send(json.dumps({"progress": {"stage": node, "hop": hop}}))
+        elif kind == "on_chain_end" and event["name"] == node == ROUTER_NODE:
+            output = event["data"].get("output") or {}
+            if isinstance(output, dict) and output.get("n_node") == ANSWER_NODE:
+                hop += 1
+                await send(json.dumps({"progress": {"stage": "memory_hop", "hop": hop}}))
+
+    state = await graph.aget_state(config)
+    messages = [msg for msg in state.values["messages"] if msg.type != "tool"]
+    return messages[-1].content
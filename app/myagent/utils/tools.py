@@ -1,18 +1,142 @@
 #Tools for the graph
 from typing import Annotated, Literal, TypedDict, Set
+import asyncio
 import json
 from langchain_core.tools import tool
 from langchain_core.runnables import RunnableConfig
 from langgraph.store.base import BaseStore
 from langgraph.prebuilt import InjectedStore
-from .models import Models
+from .models import Models, ainvoke_with_timeout
 from . import prompts
+from . import graph_version
+from .retrieval import strip_internal_values
 from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage
+from neo4j.exceptions import ClientError
+from neo4j.graph import Node, Relationship, Path
+from collections import OrderedDict
 
 
 def print_colored(text, color_code):
     print(f"\033[{color_code}m{text}\033[0m")
-model_with_tools = Models.get_model("gemini-2.0-flash")
+TOOLS_MODEL_NAME = "gemini-2.0-flash"
+def get_model_with_tools():
+    #El modelo se construye en la primera llamada (Models lo memoiza), no al importar las herramientas
+    return Models.get_model(TOOLS_MODEL_NAME)
+#Cache de queries preparados: texto normalizado -> (query a ejecutar, es solo lectura).
+#Guarda tanto los queries que ya eran válidos como las reescrituras del LLM.
+PREPARED_QUERY_CACHE_SIZE = 512
+_prepared_queries = OrderedDict()
+
+#Cache de resultados de queries de solo lectura: query normalizado -> (versión del grafo, registros, evento de nombres).
+#Una entrada vale mientras graph_version.current() no haya cambiado.
+RESULT_CACHE_SIZE = 256
+_query_results = OrderedDict()
+
+def normalize_query(query: str) -> str:
+    return " ".join(str(query).split())
+
+async def explain_query(session, query: str):
+    """
+    Valida el query con EXPLAIN: Neo4j lo parsea y planifica sin ejecutarlo.
+    Devuelve None si no es Cypher válido; si lo es, True cuando es de solo lectura (query_type "r") y False si escribe.
+    """
+    try:
+        result = await session.run("EXPLAIN " + query)
+        summary = await result.consume()
+        return summary.query_type == "r"
+    except ClientError:
+        return None
+
+async def prepare_query(session, query: str) -> tuple:
+    """
+    Devuelve (query listo para ejecutar, es solo lectura).
+    Si es Cypher válido se usa tal cual; solo si falla la validación se pide al LLM que lo arregle (POST_PROCESS_QUERY).
+    Solo se cachean los queries que pasaron EXPLAIN.
+
+    Raises:
+        ValueError: Si la corrección del LLM tampoco es Cypher válido.
+    """
+    key = normalize_query(query)
+    cached = _prepared_queries.get(key)
+    if cached is not None:
+        _prepared_queries.move_to_end(key)
+        return cached
+    read_only = await explain_query(session, query)
+    if read_only is not None:
+        prepared = query
+    else:
+        print_colored(f"Query inválido, pidiendo corrección al LLM: {query}", 33)
+        response = await ainvoke_with_timeout(
+            get_model_with_tools(),
+            [SystemMessage(content=prompts.POST_PROCESS_QUERY), HumanMessage(content=str(query))],
+        )
+        prepared = response.content
+        read_only = await explain_query(session, prepared)
+        if read_only is None:
+            #La corrección tampoco es válida: no se cachea, así la próxima vez se vuelve a pedir al LLM
+            raise ValueError(f"Query inválido aun después de corregirlo: {prepared}")
+    _prepared_queries[key] = (prepared, read_only)
+    while len(_prepared_queries) > PREPARED_QUERY_CACHE_SIZE:
+        _prepared_queries.popitem(last=False)
+    return prepared, read_only
+
+def get_cached_result(query: str):
+    key = normalize_query(query)
+    entry = _query_results.get(key)
+    if entry is None or entry[0] != graph_version.current():
+        return None
+    _query_results.move_to_end(key)
+    return entry[1], entry[2]
+
+def cache_result(query: str, version: int, results: list, names_and_relationships: dict):
+    _query_results[normalize_query(query)] = (version, results, names_and_relationships)
+    while len(_query_results) > RESULT_CACHE_SIZE:
+        _query_results.popitem(last=False)
+
+NODE_NAME_PROPERTY = "nombre"
+
+def collect_names_and_relationships(value, nodos: dict, relaciones: dict):
+    """Recorre un valor devuelto por Neo4j y acumula los nombres de nodos y los tipos de relaciones."""
+    if isinstance(value, Node):
+        nombre = value.get(NODE_NAME_PROPERTY)
+        if isinstance(nombre, str):
+            nodos[nombre] = None
+    elif isinstance(value, Relationship):
+        relaciones[value.type] = None
+        for node in (value.start_node, value.end_node):
+            if node is not None:
+                collect_names_and_relationships(node, nodos, relaciones)
+    elif isinstance(value, Path):
+        for node in value.nodes:
+            collect_names_and_relationships(node, nodos, relaciones)
+        for relationship in value.relationships:
+            relaciones[relationship.type] = None
+    elif isinstance(value, dict):
+        nombre = value.get(NODE_NAME_PROPERTY)
+        if isinstance(nombre, str):
+            nodos[nombre] = None
+        for item in value.values():
+            if isinstance(item, (Node, Relationship, Path, dict, list)):
+                collect_names_and_relationships(item, nodos, relaciones)
+    elif isinstance(value, list):
+        for item in value:
+            collect_names_and_relationships(item, nodos, relaciones)
+
+def extract_names_and_relationships(records) -> dict:
+    """
+    Arma el evento {"nodos": [...], "relaciones": [...]} que resalta el grafo en el frontend,
+    leyendo directamente los Node/Relationship/Path del resultado (sin pasar por el LLM).
+    Las columnas escalares que terminan en "nombre" (p. ej. n.nombre) también cuentan como nodos.
+    """
+    nodos, relaciones = {}, {}
+    for record in records:
+        for key, value in record.items():
+            if isinstance(value, str) and key.split(".")[-1] == NODE_NAME_PROPERTY:
+                nodos[value] = None
+            else:
+                collect_names_and_relationships(value, nodos, relaciones)
+    return {"nodos": list(nodos), "relaciones": list(relaciones)}
+
 def clean_json_response(response_text):
     """
     Limpia la respuesta eliminando los delimitadores de código Markdown para JSON si existen.
@@ -52,20 +176,29 @@ async def execute_query(query: str,config: RunnableConfig,) -> list:
     configurable = config["configurable"]
     websocket = configurable["websocket"]
     driver = configurable["driver"]
-    prompt = prompts.POST_PROCESS_QUERY
-    response = model_with_tools.invoke([SystemMessage(content=prompt), HumanMessage(content=str(query))])
-    processed_query = response.content
-    prompt_extract = prompts.EXTRACT_NODES_AND_RELATIONSHIPS_NAMES
     
+    cached = get_cached_result(query)
+    if cached is not None:
+        results, names_and_relationships = cached
+        print_colored(f"Resultado desde cache (versión {graph_version.current()}): {query}", 38)
+        await websocket.send(json.dumps(names_and_relationships, ensure_ascii=False))
+        return results
     
     try:
-        with driver.session() as session:
-            result = session.run(processed_query)
-            results = [record.data() for record in result]
-            extract_name_and_relationships_result= model_with_tools.invoke([SystemMessage(content=prompt_extract), HumanMessage(content=str(results))])        
-            names_and_relationships = extract_name_and_relationships_result.content
-            names_and_relationships=clean_json_response(names_and_relationships)
-            await websocket.send(names_and_relationships)
+        #driver es el AsyncDriver del agente: mientras Neo4j responde, el loop atiende a los demás clientes
+        async with driver.session() as session:
+            processed_query, read_only = await prepare_query(session, query)
+            version = graph_version.current()
+            result = await session.run(processed_query)
+            records = [record async for record in result]
+            names_and_relationships = extract_names_and_relationships(records)
+            await websocket.send(json.dumps(names_and_relationships, ensure_ascii=False))
+            results = [strip_internal_values(record.data()) for record in records]
+            if read_only:
+                cache_result(query, version, results, names_and_relationships)
+            else:
+                #El log de revisiones es SQLite: la escritura va a un hilo para no frenar el loop
+                await asyncio.to_thread(graph_version.bump)
             return results
     except Exception as e:
         error_message = {"error": f"Error en la consulta: {str(e)}"}
@@ -82,16 +215,16 @@ def execute_tool(tool_name:str):
     print_colored(f"Ejecutando herramienta externa: {tool_name}", 35)
     return "Se ha ejecutado la herramienta {tool_name} correctamente."
     
-def execute_query_entry(query: str,config: RunnableConfig) -> list:
-    prompt = prompts.POST_PROCESS_QUERY
-    response = model_with_tools.invoke([SystemMessage(content=prompt), HumanMessage(content=str(query))])
-    processed_query = response.content
+async def execute_query_entry(query: str,config: RunnableConfig) -> list:
     configurable = config["configurable"]
     driver = configurable["driver"]
     try:
-        with driver.session() as session:
-            result = session.run(processed_query)
-            results = [record.data() for record in result]
+        async with driver.session() as session:
+            processed_query, read_only = await prepare_query(session, query)
+            result = await session.run(processed_query)
+            results = strip_internal_values(await result.data())
+            if not read_only:
+                await asyncio.to_thread(graph_version.bump)
             print_colored(f"Query ejecutado: {processed_query}", 38)
             print_colored(f"Resultados: {results}", 38)
             return results
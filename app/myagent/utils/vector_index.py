@@ -0,0 +1,354 @@
+#Indice vectorial local que replica en memoria los indices de Neo4j (episodic_index, semantic_index).
+#Para grafos pequeños hace búsqueda exacta con una multiplicación de matrices en NumPy;
+#si el índice crece por encima de LOCAL_INDEX_HNSW_THRESHOLD y hnswlib está instalado, usa HNSW.
+#Mientras no esté cargado ("frío") las búsquedas deben ir a Neo4j.
+#El índice recuerda la revisión de graph_version con la que quedó al día: si el grafo avanzó, se pone al día
+#en segundo plano (o se recarga entero tras un reset) y mientras tanto las búsquedas vuelven a ir a Neo4j.
+import os
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+from . import graph_version
+from .retrieval import strip_internal_properties
+
+LOCAL_INDEX_ENABLED = os.getenv("LOCAL_VECTOR_INDEX", "true").lower() == "true"
+LOCAL_INDEX_HNSW_THRESHOLD = int(os.getenv("LOCAL_INDEX_HNSW_THRESHOLD", "50000"))
+MEMORY_INDEXES = ("episodic_index", "semantic_index")
+
+SHOW_INDEXES_QUERY = """
+SHOW VECTOR INDEXES YIELD name, entityType, labelsOrTypes, properties, options
+WHERE name IN $names AND entityType = 'NODE'
+RETURN name, labelsOrTypes[0] AS label, properties[0] AS property,
+       options.indexConfig['vector.similarity_function'] AS similarity
+"""
+
+LOAD_INDEX_QUERY = """
+MATCH (n:{label})
+WHERE n.{property} IS NOT NULL
+RETURN elementId(n) AS id, ID(n) AS node_id, properties(n) AS properties
+"""
+
+REFRESH_BY_ELEMENT_ID_QUERY = """
+MATCH (n) WHERE elementId(n) IN $ids
+RETURN elementId(n) AS id, ID(n) AS node_id, labels(n) AS labels, properties(n) AS properties
+"""
+
+REFRESH_BY_NODE_ID_QUERY = """
+MATCH (n) WHERE ID(n) IN $ids
+RETURN elementId(n) AS id, ID(n) AS node_id, labels(n) AS labels, properties(n) AS properties
+"""
+
+
+class _MemoryIndex:
+    """Vectores de un solo índice de Neo4j, con filas indexadas por elementId."""
+
+    def __init__(self, name, label, property, similarity="cosine"):
+        self.name = name
+        self.label = label
+        self.property = property
+        self.similarity = (similarity or "cosine").lower()
+        self.ids = []
+        self.properties = []
+        self.rows = {}
+        self.vectors = None
+        self.hnsw = None
+        self._hnsw_deleted = set()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _prepare(self, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.similarity == "cosine":
+            norm = np.linalg.norm(vector)
+            if norm:
+                vector = vector / norm
+        return vector
+
+    def upsert(self, element_id, properties, vector):
+        vector = self._prepare(vector)
+        if self.vectors is None:
+            self.vectors = np.empty((16, vector.shape[0]), dtype=np.float32)
+        row = self.rows.get(element_id)
+        if row is None:
+            row = len(self.ids)
+            if row == self.vectors.shape[0]:
+                grown = np.empty((row * 2, self.vectors.shape[1]), dtype=np.float32)
+                grown[:row] = self.vectors[:row]
+                self.vectors = grown
+            self.ids.append(element_id)
+            self.properties.append(properties)
+            self.rows[element_id] = row
+        else:
+            self.properties[row] = properties
+        self.vectors[row] = vector
+        if self.hnsw is not None:
+            self._hnsw_set(row)
+
+    def remove(self, element_id):
+        row = self.rows.pop(element_id, None)
+        if row is None:
+            return
+        last = len(self.ids) - 1
+        if row != last:
+            self.ids[row] = self.ids[last]
+            self.properties[row] = self.properties[last]
+            self.vectors[row] = self.vectors[last]
+            self.rows[self.ids[row]] = row
+        self.ids.pop()
+        self.properties.pop()
+        if self.hnsw is not None:
+            self.hnsw.mark_deleted(last)
+            self._hnsw_deleted.add(last)
+            if row != last:
+                self._hnsw_set(row)
+
+    def _hnsw_set(self, row):
+        #Actualiza HNSW en sitio: las etiquetas de HNSW son las filas de la matriz.
+        if row in self._hnsw_deleted:
+            self.hnsw.unmark_deleted(row)
+            self._hnsw_deleted.discard(row)
+        if row >= self.hnsw.get_max_elements():
+            self.hnsw.resize_index(max(row + 1, self.hnsw.get_max_elements() * 2))
+        self.hnsw.add_items(self.vectors[row:row + 1], np.array([row]))
+
+    def _build_hnsw(self):
+        space = "cosine" if self.similarity == "cosine" else "l2"
+        index = hnswlib.Index(space=space, dim=self.vectors.shape[1])
+        index.init_index(max_elements=len(self.ids), ef_construction=200, M=16)
+        index.add_items(self.vectors[:len(self.ids)], np.arange(len(self.ids)))
+        index.set_ef(64)
+        self.hnsw = index
+        self._hnsw_deleted = set()
+
+    def _scores(self, vector, k):
+        size = len(self.ids)
+        if hnswlib is not None and size >= LOCAL_INDEX_HNSW_THRESHOLD:
+            if self.hnsw is None:
+                self._build_hnsw()
+            rows, distances = self.hnsw.knn_query(vector, k=k)
+            rows, distances = rows[0], distances[0]
+            if self.similarity == "cosine":
+                return rows, 1.0 - distances
+            return rows, distances
+        matrix = self.vectors[:size]
+        if self.similarity == "cosine":
+            scores = matrix @ vector
+        else:
+            scores = -np.sum((matrix - vector) ** 2, axis=1)
+        top = np.argpartition(-scores, k - 1)[:k] if k < size else np.arange(size)
+        top = top[np.argsort(-scores[top])]
+        if self.similarity == "cosine":
+            return top, scores[top]
+        return top, -scores[top]
+
+    def search(self, vector, k):
+        """Devuelve [{"node": propiedades, "score": float}] con la misma escala de score que Neo4j."""
+        k = min(int(k), len(self.ids))
+        if k <= 0:
+            return []
+        rows, raw = self._scores(self._prepare(vector), k)
+        results = []
+        for row, value in zip(rows, raw):
+            if self.similarity == "cosine":
+                score = (1.0 + float(value)) / 2.0
+            else:
+                score = 1.0 / (1.0 + float(value))
+            results.append({"node": self.properties[int(row)], "score": score})
+        return results
+
+
+class LocalVectorIndex:
+    """
+    Réplica en memoria de los índices vectoriales de memoria.
+
+    Se carga desde Neo4j con load(). Los endpoints REST pueden empujar cambios con refresh_element_ids/
+    refresh_node_ids, pero lo que decide si el índice sirve es la revisión del grafo: has_index() devuelve
+    False mientras el índice esté atrasado respecto de graph_version.current().
+    """
+
+    def __init__(self, index_names=MEMORY_INDEXES):
+        self.index_names = tuple(index_names)
+        self.indexes = {}
+        self.ready = False
+        self.error = None
+        self.revision = None
+        self._element_ids = {}
+        self._driver = None
+        self._syncing = False
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return LOCAL_INDEX_ENABLED and np is not None
+
+    def load(self, driver):
+        """Lee la definición de los índices y todos sus vectores. Mientras tanto el índice queda frío."""
+        if not self.available:
+            return False
+        self._driver = driver
+        #La revisión se lee antes que los datos: lo que cambie durante la carga se recupera con sync()
+        revision = graph_version.current()
+        try:
+            indexes = {}
+            element_ids = {}
+            with driver.session() as session:
+                definitions = session.run(SHOW_INDEXES_QUERY, names=list(self.index_names)).data()
+                for definition in definitions:
+                    memory_index = _MemoryIndex(
+                        definition["name"], definition["label"], definition["property"], definition["similarity"]
+                    )
+                    result = session.run(
+                        LOAD_INDEX_QUERY.format(label=memory_index.label, property=memory_index.property)
+                    )
+                    for record in result:
+                        properties = record["properties"]
+                        memory_index.upsert(
+                            record["id"], strip_internal_properties(properties), properties[memory_index.property]
+                        )
+                        element_ids[record["node_id"]] = record["id"]
+                    indexes[memory_index.name] = memory_index
+            with self._lock:
+                self.indexes = indexes
+                self._element_ids = element_ids
+                self.revision = revision
+                self.ready = True
+                self.error = None
+            return True
+        except Exception as e:
+            with self._lock:
+                self.ready = False
+                self.error = str(e)
+            return False
+
+    def load_in_background(self, driver):
+        thread = threading.Thread(target=self.load, args=(driver,), daemon=True)
+        thread.start()
+        return thread
+
+    def has_index(self, index_name):
+        """True solo si el índice existe y está al día; si el grafo avanzó lanza sync() en segundo plano."""
+        if not self.ready or index_name not in self.indexes:
+            return False
+        if self.revision != graph_version.current():
+            self.sync_in_background()
+            return False
+        return True
+
+    def sync(self, driver=None):
+        """
+        Pone el índice al día con el log de graph_version: relee los nodos que cambiaron y quita los borrados.
+        Si hubo un reset (Cypher libre, importación) o el log ya no alcanza, recarga todo desde Neo4j.
+        """
+        driver = driver or self._driver
+        if driver is None or not self.ready:
+            return
+        target = graph_version.current()
+        changes = graph_version.changes_since(self.revision)
+        if changes["reset"]:
+            #Lo cargado puede tener nodos borrados o reemplazados: se deja de usar hasta recargar
+            with self._lock:
+                self.ready = False
+            self.load(driver)
+            return
+        node_ids = [int(node_id) for node_id in changes["nodes"] + changes["removed_nodes"]]
+        if node_ids:
+            self.refresh_node_ids(driver, node_ids)
+        if changes["embedded"]:
+            self.refresh_element_ids(driver, changes["embedded"])
+        with self._lock:
+            if self.ready:
+                self.revision = target
+
+    def advance(self, previous, revision):
+        """Lo llama quien ya refrescó su propia escritura: si no hubo otros cambios en el medio, el índice queda al día."""
+        with self._lock:
+            if self.ready and self.revision == previous:
+                self.revision = revision
+
+    def sync_in_background(self):
+        with self._lock:
+            if self._syncing:
+                return
+            self._syncing = True
+
+        def run():
+            try:
+                self.sync()
+            except Exception as e:
+                with self._lock:
+                    self.ready = False
+                    self.error = str(e)
+            finally:
+                with self._lock:
+                    self._syncing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def search(self, index_name, query_vector, k):
+        with self._lock:
+            return self.indexes[index_name].search(query_vector, k)
+
+    def _apply(self, records, removed_ids=()):
+        with self._lock:
+            if not self.ready:
+                return
+            for element_id in removed_ids:
+                for memory_index in self.indexes.values():
+                    memory_index.remove(element_id)
+            for record in records:
+                properties = record["properties"]
+                labels = set(record["labels"])
+                self._element_ids[record["node_id"]] = record["id"]
+                for memory_index in self.indexes.values():
+                    vector = properties.get(memory_index.property)
+                    if memory_index.label in labels and vector is not None:
+                        memory_index.upsert(record["id"], strip_internal_properties(properties), vector)
+                    else:
+                        memory_index.remove(record["id"])
+
+    def refresh_element_ids(self, driver, element_ids):
+        """Vuelve a leer de Neo4j los nodos indicados por elementId; los que ya no existen se quitan."""
+        if not self.ready or not element_ids:
+            return
+        with driver.session() as session:
+            records = session.run(REFRESH_BY_ELEMENT_ID_QUERY, ids=list(element_ids)).data()
+        found = {record["id"] for record in records}
+        self._apply(records, [element_id for element_id in element_ids if element_id not in found])
+
+    def refresh_node_ids(self, driver, node_ids):
+        """Igual que refresh_element_ids pero con el ID(n) numérico que usan los endpoints REST."""
+        if not self.ready or not node_ids:
+            return
+        node_ids = [int(node_id) for node_id in node_ids]
+        with driver.session() as session:
+            records = session.run(REFRESH_BY_NODE_ID_QUERY, ids=node_ids).data()
+        found = {record["node_id"] for record in records}
+        with self._lock:
+            removed = [self._element_ids.pop(node_id) for node_id in node_ids
+                       if node_id not in found and node_id in self._element_ids]
+        self._apply(records, removed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.available,
+                "ready": self.ready,
+                "error": self.error,
+                "revision": self.revision,
+                "hnsw_available": hnswlib is not None,
+                "indexes": {
+                    name: {"label": index.label, "property": index.property,
+                           "similarity": index.similarity, "size": len(index)}
+                    for name, index in self.indexes.items()
+                },
+            }
@@ -1,11 +1,33 @@
 #!/usr/bin/env python
 import argparse
+import hashlib
 import json
 from neo4j import GraphDatabase
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
 import os
+import random
 import sys
+import tempfile
+import textwrap
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dotenv import load_dotenv
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# The graph revision log is shared with the API server (app/main_ws.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "app"))
+from myagent.utils import graph_version
+
 # Load environment variables from .env file if it exists
 load_dotenv()
 
@@ -39,157 +61,156 @@ def clean_database(driver):
         print(f"❌ Failed to clean database: {str(e)}")
         return False
 
-def export_database(driver, output_file, bd_id=None):
-    """Export all nodes and relationships from the database to a JSON file"""
+# Imported nodes and relationships are exported under their app_id, so an export can be upserted back
+# without the upsert seeing a brand new graph; the upsert bookkeeping itself is not exported
+EXPORT_NODES_PAGE_QUERY = """
+MATCH (n) WHERE id(n) > $after
+RETURN id(n) AS internal_id, coalesce(n.app_id, elementId(n)) AS id,
+       [label IN labels(n) WHERE label <> 'Importado'] AS labels, n {.*, embedding: null} AS properties
+ORDER BY internal_id
+LIMIT $limit
+"""
+
+EXPORT_RELATIONSHIPS_PAGE_QUERY = """
+MATCH (a)-[r]->(b) WHERE id(r) > $after
+RETURN id(r) AS internal_id, coalesce(r.app_id, elementId(r)) AS id, type(r) AS tipo,
+       coalesce(a.app_id, elementId(a)) AS origen, coalesce(b.app_id, elementId(b)) AS destino,
+       properties(r) AS properties
+ORDER BY internal_id
+LIMIT $limit
+"""
+
+def iter_export_pages(session, query, page_size):
+    """Page through nodes or relationships ordered by internal id, yielding one list of records per page"""
+    after = -1
+    while True:
+        page = session.run(query, after=after, limit=page_size).data()
+        if not page:
+            return
+        after = page[-1]["internal_id"]
+        for record in page:
+            del record["internal_id"]
+        yield page
+
+def export_section(session, f, section, query, total, page_size, ndjson):
+    """Write one section page by page, rewriting ids to the bd_id format as each page arrives"""
+    kind = "node" if section == "nodos" else "relationship"
+    written = 0
+    if not ndjson:
+        f.write(f'  "{section}": [')
+    for page in iter_export_pages(session, query, page_size):
+        for item in page:
+            for key in ("id", "origen", "destino"):
+                if key in item:
+                    item[key] = format_bd_id(item[key])
+            item["properties"] = strip_import_bookkeeping(item["properties"])
+            if ndjson:
+                f.write(json.dumps({"kind": kind, **item}, ensure_ascii=False) + "\n")
+            else:
+                f.write(("," if written else "") + "\n" + textwrap.indent(json.dumps(item, ensure_ascii=False, indent=2), "    "))
+            written += 1
+        print(f"📦 {section}: {written}/{total}")
+    if not ndjson:
+        f.write("\n  ]" if written else "]")
+    return written
+
+EXPORT_EMBEDDINGS_PAGE_QUERY = """
+MATCH (n) WHERE id(n) > $after AND n.embedding IS NOT NULL
+RETURN id(n) AS internal_id, coalesce(n.app_id, elementId(n)) AS id, n.embedding AS embedding
+ORDER BY internal_id
+LIMIT $limit
+"""
+
+def sidecar_ids_path(sidecar_path):
+    """Path of the text file listing, one per line, the exported node id of each sidecar row"""
+    return os.path.splitext(sidecar_path)[0] + ".ids.txt"
+
+def export_embeddings(driver, sidecar_path, page_size=1000, dtype="float32"):
+    """Write every node embedding to a .npy matrix (memory-mapped while writing) keyed by exported node id"""
+    if np is None:
+        print("❌ Exporting embeddings requires numpy (pip install numpy)")
+        return False
     try:
         with driver.session() as session:
-            # Verificar primero si hay nodos en la base de datos
-            check_query = "MATCH (n) RETURN count(n) as node_count"
-            check_result = session.run(check_query)
-            node_count = check_result.single()["node_count"]
+            count = session.run("MATCH (n) WHERE n.embedding IS NOT NULL RETURN count(n) AS count").single()["count"]
+            if count == 0:
+                print("⚠️ No hay embeddings para exportar")
+                return True
+            dimensions = session.run(
+                "MATCH (n) WHERE n.embedding IS NOT NULL WITH n LIMIT 1 RETURN size(n.embedding) AS dimensions"
+            ).single()["dimensions"]
+            print(f"📊 Exportando {count} embeddings de {dimensions} dimensiones ({dtype})")
+
+            start = time.perf_counter()
+            vectors = np.lib.format.open_memmap(sidecar_path, mode="w+", dtype=dtype, shape=(count, dimensions))
+            written = 0
+            with open(sidecar_ids_path(sidecar_path), 'w', encoding='utf-8') as ids_file:
+                for page in iter_export_pages(session, EXPORT_EMBEDDINGS_PAGE_QUERY, page_size):
+                    for record in page:
+                        if written == count:
+                            break
+                        if len(record["embedding"]) != dimensions:
+                            print(f"⚠️ Skipping {record['id']}: {len(record['embedding'])} dimensions, expected {dimensions}")
+                            continue
+                        vectors[written] = record["embedding"]
+                        ids_file.write(format_bd_id(record["id"]) + "\n")
+                        written += 1
+                    print(f"📦 embeddings: {written}/{count}")
+            vectors.flush()
+            del vectors
+            if written < count:
+                # Nodes lost their embedding during the export: shrink the matrix to the rows actually written
+                shrunk = np.array(np.load(sidecar_path, mmap_mode="r")[:written])
+                np.save(sidecar_path, shrunk)
+            print(f"✅ Embeddings exported to {sidecar_path} in {time.perf_counter() - start:.2f}s")
+            return True
+    except Exception as e:
+        print(f"❌ Failed to export embeddings: {str(e)}")
+        return False
+
+def export_database(driver, output_file, bd_id=None, page_size=1000, output_format=None):
+    """Export all nodes and relationships page by page to a JSON ({nodos, relaciones}) or NDJSON file"""
+    ndjson = output_format == "ndjson" or (output_format is None and is_ndjson_file(output_file))
+    try:
+        with driver.session() as session:
+            node_count = session.run("MATCH (n) RETURN count(n) AS node_count").single()["node_count"]
+            rel_count = session.run("MATCH ()-[r]->() RETURN count(r) AS rel_count").single()["rel_count"]
             
             if node_count == 0:
                 print(f"⚠️ La base de datos está vacía (0 nodos encontrados)")
-                # Crear un JSON vacío pero válido
-                data = {"nodos": [], "relaciones": []}
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
-                print(f"✅ Se ha creado un archivo JSON vacío en {output_file}")
-                return True
-            
-            # Si hay nodos, proceder con la exportación normal
-            print(f"📊 Encontrados {node_count} nodos para exportar")
-            
-            # The query to extract all nodes and relationships, using elementId() instead of deprecated id()
-            query = """
-            MATCH (n)
-            WITH COLLECT({
-              id: elementId(n),
-              labels: labels(n),
-              properties: n {.*, embedding: null}
-            }) AS nodos
-            OPTIONAL MATCH (a)-[r]->(b)
-            WITH nodos, COLLECT({
-              id: CASE WHEN r IS NULL THEN null ELSE elementId(r) END,
-              tipo: CASE WHEN r IS NULL THEN null ELSE type(r) END,
-              origen: CASE WHEN a IS NULL THEN null ELSE elementId(a) END,
-              destino: CASE WHEN b IS NULL THEN null ELSE elementId(b) END,
-              properties: CASE WHEN r IS NULL THEN null ELSE properties(r) END
-            }) AS relaciones_temp
-            WITH nodos, [rel IN relaciones_temp WHERE rel.id IS NOT NULL] AS relaciones
-            RETURN {nodos: nodos, relaciones: relaciones} AS resultado
-            """
+            else:
+                print(f"📊 Encontrados {node_count} nodos y {rel_count} relaciones para exportar")
+            print(f"🔄 Reemplazando IDs con 'bd_id'")
             
-            result = session.run(query)
-            record = result.single()
+            with open(output_file, 'w', encoding='utf-8') as f:
+                if not ndjson:
+                    f.write("{\n")
+                exported_nodes = export_section(session, f, "nodos", EXPORT_NODES_PAGE_QUERY, node_count, page_size, ndjson)
+                if not ndjson:
+                    f.write(",\n")
+                exported_rels = export_section(session, f, "relaciones", EXPORT_RELATIONSHIPS_PAGE_QUERY, rel_count, page_size, ndjson)
+                if not ndjson:
+                    f.write("\n}\n")
             
-            if record and record["resultado"]:
-                data = record["resultado"]
-                
-                # Always apply ID formatting
-                print(f"🔄 Reemplazando IDs con 'bd_id'")
-                
-                # Create a mapping of original IDs to new IDs
-                id_mapping = {}
-                
-                # Format node IDs with "bd_id"
-                for i, node in enumerate(data.get('nodos', [])):
-                    if 'id' in node:
-                        original_id = node['id']
-                        # Use a simple format: node_type:bd_id:index
-                        # Extract the node type from the original ID (first part before colon)
-                        if ':' in original_id:
-                            parts = original_id.split(':')
-                            if len(parts) >= 3:
-                                first_part = parts[0]
-                                last_part = parts[-1]
-                                new_id = f"{first_part}:bd_id:{last_part}"
-                                
-                                # Store the mapping
-                                id_mapping[original_id] = new_id
-                                
-                                # Apply the new ID
-                                old_id = node['id']
-                                node['id'] = new_id
-                                print(f"Node ID changed: {old_id} -> {new_id}")
-                        else:
-                            print(f"Warning: Node ID doesn't have expected format: {original_id}")
-                
-                # Process relationships
-                for i, rel in enumerate(data.get('relaciones', [])):
-                    # Process relationship ID
-                    if 'id' in rel:
-                        original_id = rel['id']
-                        if ':' in original_id:
-                            parts = original_id.split(':')
-                            if len(parts) >= 3:
-                                first_part = parts[0]
-                                last_part = parts[-1]
-                                new_id = f"{first_part}:bd_id:{last_part}"
-                                old_id = rel['id']
-                                rel['id'] = new_id
-                                print(f"Rel ID changed: {old_id} -> {new_id}")
-                        else:
-                            print(f"Warning: Rel ID doesn't have expected format: {original_id}")
-                    
-                    # Process origen ID using the mapping
-                    if 'origen' in rel:
-                        original_origen = rel['origen']
-                        if original_origen in id_mapping:
-                            old_id = rel['origen']
-                            rel['origen'] = id_mapping[original_origen]
-                            print(f"Origen ID changed: {old_id} -> {rel['origen']}")
-                        else:
-                            # Direct replacement if not in mapping
-                            if ':' in original_origen:
-                                parts = original_origen.split(':')
-                                if len(parts) >= 3:
-                                    first_part = parts[0]
-                                    last_part = parts[-1]
-                                    rel['origen'] = f"{first_part}:bd_id:{last_part}"
-                                    print(f"Origen ID direct changed: {original_origen} -> {rel['origen']}")
-                            else:
-                                print(f"Warning: No mapping found for origen: {original_origen}")
-                                
-                    # Process destino ID using the mapping
-                    if 'destino' in rel:
-                        original_destino = rel['destino']
-                        if original_destino in id_mapping:
-                            old_id = rel['destino']
-                            rel['destino'] = id_mapping[original_destino]
-                            print(f"Destino ID changed: {old_id} -> {rel['destino']}")
-                        else:
-                            # Direct replacement if not in mapping
-                            if ':' in original_destino:
-                                parts = original_destino.split(':')
-                                if len(parts) >= 3:
-                                    first_part = parts[0]
-                                    last_part = parts[-1]
-                                    rel['destino'] = f"{first_part}:bd_id:{last_part}"
-                                    print(f"Destino ID direct changed: {original_destino} -> {rel['destino']}")
-                            else:
-                                print(f"Warning: No mapping found for destino: {original_destino}")
-                
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
-                print(f"✅ Database exported successfully to {output_file}")
-                print(f"  Exported {len(data.get('nodos', []))} nodes and {len(data.get('relaciones', []))} relationships")
-                return True
-            else:
-                print("❌ No se pudo obtener datos de la base. Consulta devolvió resultado vacío.")
-                return False
+            print(f"✅ Database exported successfully to {output_file}")
+            print(f"  Exported {exported_nodes} nodes and {exported_rels} relationships")
+            return True
                 
     except Exception as e:
         print(f"❌ Failed to export database: {str(e)}")
         return False
 
+def strip_import_bookkeeping(properties):
+    """Drop the app_id and content_hash properties the importer writes, keeping only the node's own data"""
+    return {key: value for key, value in (properties or {}).items() if key not in ("app_id", "content_hash")}
+
 def clean_properties(properties):
     """Remove 'embedding' property and ensure properties are in correct format"""
     if not properties or len(properties) == 0:
         return {}
     
-    # Create a copy to avoid modifying the original
-    cleaned = properties.copy()
+    # Create a copy to avoid modifying the original (and without the importer's own bookkeeping)
+    cleaned = strip_import_bookkeeping(properties)
     
     # Remove embedding if present
     if 'embedding' in cleaned:
@@ -225,6 +246,7 @@ def create_node(driver, node):
     # Query to create node
     query = (
         "CREATE (n" + labels_str + " $propiedades) "
+        "SET n.app_id = $node_id "
         "RETURN elementId(n) as nodeId"
     )
     
@@ -232,7 +254,8 @@ def create_node(driver, node):
         with driver.session() as session:
             result = session.run(
                 query,
-                propiedades=propiedades
+                propiedades=propiedades,
+                node_id=node_id
             )
             record = result.single()
             if record:
@@ -273,6 +296,7 @@ def create_relationship(driver, relationship, node_mapping):
         "MATCH (a), (b) "
         "WHERE elementId(a) = $origen_interno AND elementId(b) = $destino_interno "
         f"CREATE (a)-[r:{tipo} $propiedades]->(b) "
+        "SET r.app_id = $app_id "
         "RETURN elementId(r) as relId"
     )
     
@@ -282,7 +306,8 @@ def create_relationship(driver, relationship, node_mapping):
                 query, 
                 origen_interno=origen_interno,
                 destino_interno=destino_interno, 
-                propiedades=propiedades
+                propiedades=propiedades,
+                app_id=relationship_app_id(relationship)
             )
             record = result.single()
             if record:
@@ -291,6 +316,370 @@ def create_relationship(driver, relationship, node_mapping):
     except Exception as e:
         return {"success": False, "error": str(e), "original_id": rel_id}
 
+def import_nodes(driver, nodes, node_mapping, dry_run=False):
+    """Create nodes one by one, filling node_mapping with original id -> elementId"""
+    node_results = {
+        "success": 0,
+        "failed": 0,
+        "failures": []
+    }
+    
+    for node in nodes:
+        # Print the node without embedding in dry run mode
+        if dry_run:
+            node_copy = node.copy()
+            if "propiedades" in node_copy and "embedding" in node_copy["propiedades"]:
+                node_copy["propiedades"] = node_copy["propiedades"].copy()
+                del node_copy["propiedades"]["embedding"]
+            elif "properties" in node_copy and "embedding" in node_copy["properties"]:
+                node_copy["properties"] = node_copy["properties"].copy()
+                del node_copy["properties"]["embedding"]
+            print(f"Would create node: {node_copy}")
+            continue
+        
+        result = create_node(driver, node)
+        
+        if result.get("success", False):
+            node_results["success"] += 1
+            # Almacenar el mapeo de ID original a ID interno de Neo4j
+            node_mapping[node.get('id')] = result['nodeId']
+            print(f"✅ Created node with ID: {result['nodeId']} (Original ID: {node.get('id')})")
+        else:
+            node_results["failed"] += 1
+            error_info = {
+                "original_id": result.get("original_id"),
+                "error": result.get("error")
+            }
+            node_results["failures"].append(error_info)
+            print(f"❌ Failed to create node with ID: {node.get('id')}")
+            print(f"   Error: {result.get('error')}")
+    return node_results
+
+def import_relationships(driver, relationships, node_mapping, dry_run=False):
+    """Create relationships one by one using node_mapping to resolve origen and destino"""
+    rel_results = {
+        "success": 0,
+        "failed": 0,
+        "failures": []
+    }
+    
+    # Process each relationship
+    for rel in number_relationships(relationships):
+        if dry_run:
+            # Just print relationship info in dry run mode
+            rel_copy = rel.copy()
+            if "propiedades" in rel_copy and "embedding" in rel_copy["propiedades"]:
+                rel_copy["propiedades"] = rel_copy["propiedades"].copy()
+                del rel_copy["propiedades"]["embedding"]
+            elif "properties" in rel_copy and "embedding" in rel_copy["properties"]:
+                rel_copy["properties"] = rel_copy["properties"].copy()
+                del rel_copy["properties"]["embedding"]
+            print(f"Would create: {rel_copy['origen']} -[:{rel_copy['tipo']}]-> {rel_copy['destino']}")
+            continue
+        
+        result = create_relationship(driver, rel, node_mapping)
+        
+        if result.get("success", False):
+            rel_results["success"] += 1
+            print(f"✅ Created relationship: {rel['origen']} -[:{rel['tipo']}]-> {rel['destino']} (ID: {result['relId']})")
+        else:
+            rel_results["failed"] += 1
+            error_info = {
+                "original_id": result.get("original_id"),
+                "error": result.get("error"),
+                "relation": f"{rel['origen']} -[:{rel['tipo']}]-> {rel['destino']}"
+            }
+            rel_results["failures"].append(error_info)
+            print(f"❌ Failed to create relationship: {rel['origen']} -[:{rel['tipo']}]-> {rel['destino']}")
+            print(f"   Error: {result.get('error')}")
+    return rel_results
+
+def get_node_labels(node):
+    """Return the labels of a node, accepting both 'etiquetas' and 'labels'"""
+    return node.get("etiquetas") or node.get("labels") or []
+
+def get_properties(item):
+    """Return the cleaned properties of a node or relationship, accepting 'propiedades' or 'properties'"""
+    if "propiedades" in item:
+        return clean_properties(item.get("propiedades", {}))
+    if "properties" in item:
+        return clean_properties(item.get("properties", {}))
+    return {}
+
+def create_nodes_batch(tx, labels, rows):
+    """Create every node of a label group with a single UNWIND and return original id -> elementId"""
+    labels_str = ":" + ":".join(labels) if labels else ""
+    query = (
+        "UNWIND $rows AS row "
+        f"CREATE (n{labels_str}) "
+        "SET n = row.propiedades, n.app_id = row.id "
+        "RETURN row.id AS original_id, elementId(n) AS nodeId"
+    )
+    result = tx.run(query, rows=rows)
+    return {record["original_id"]: record["nodeId"] for record in result}
+
+def create_relationships_batch(tx, tipo, rows):
+    """Create every relationship of a type with a single UNWIND and return how many were created"""
+    query = (
+        "UNWIND $rows AS row "
+        "MATCH (a) WHERE elementId(a) = row.origen "
+        "MATCH (b) WHERE elementId(b) = row.destino "
+        f"CREATE (a)-[r:{tipo}]->(b) "
+        "SET r = row.propiedades, r.app_id = row.id "
+        "RETURN count(r) AS created"
+    )
+    record = tx.run(query, rows=rows).single()
+    return record["created"] if record else 0
+
+def iter_grouped_batches(rows, key, batch_size):
+    """Yield (group, batch) pairs as soon as a group fills a batch, so only one open batch per group is kept in memory"""
+    buffers = {}
+    for row in rows:
+        group = key(row)
+        buffer = buffers.setdefault(group, [])
+        buffer.append(row)
+        if len(buffer) >= batch_size:
+            yield group, buffer
+            buffers[group] = []
+    for group, buffer in buffers.items():
+        if buffer:
+            yield group, buffer
+
+def node_rows(nodes, results):
+    """Turn nodes into UNWIND rows, recording the ones that cannot be imported"""
+    for node in nodes:
+        if node.get("id") is None:
+            results["failed"] += 1
+            results["failures"].append({"original_id": None, "error": "Missing required field: id"})
+            continue
+        yield {"id": node["id"], "labels": tuple(get_node_labels(node)), "propiedades": get_properties(node)}
+
+def relationship_rows(relationships, node_mapping, results):
+    """Turn relationships into UNWIND rows resolved through node_mapping, recording the ones that cannot be imported"""
+    for rel in number_relationships(relationships):
+        origen, destino, tipo = rel.get("origen"), rel.get("destino"), rel.get("tipo")
+        relation = f"{origen} -[:{tipo}]-> {destino}"
+        if None in [origen, destino, tipo]:
+            error = "Missing required fields: origen, destino, or tipo"
+        elif origen not in node_mapping or destino not in node_mapping:
+            error = f"Node mapping not found for origen={origen} or destino={destino}"
+        else:
+            yield {
+                "id": relationship_app_id(rel),
+                "tipo": tipo,
+                "origen": node_mapping[origen],
+                "destino": node_mapping[destino],
+                "propiedades": get_properties(rel),
+                "relation": relation,
+            }
+            continue
+        results["failed"] += 1
+        results["failures"].append({"original_id": rel.get("id"), "error": error, "relation": relation})
+
+RETRYABLE_ERRORS = (TransientError, ServiceUnavailable, SessionExpired)
+
+def write_with_retry(session, work, *args, retries=5, base_delay=0.5):
+    """Run work in a write transaction, retrying transient errors (deadlocks, lock timeouts, lost connections) with exponential backoff"""
+    for attempt in range(retries + 1):
+        try:
+            return session.execute_write(work, *args)
+        except RETRYABLE_ERRORS as e:
+            if attempt == retries:
+                raise
+            delay = base_delay * (2 ** attempt) * (1 + random.random())
+            print(f"⚠️ Transient error, retrying in {delay:.1f}s ({attempt + 1}/{retries}): {e}")
+            time.sleep(delay)
+
+def write_node_batch(session, labels, batch, node_mapping, results):
+    """Write one node batch and record its outcome"""
+    try:
+        created = write_with_retry(session, create_nodes_batch, labels, batch)
+        node_mapping.update(created)
+        results["success"] += len(created)
+    except Exception as e:
+        results["failed"] += len(batch)
+        for row in batch:
+            results["failures"].append({"original_id": row["id"], "error": str(e)})
+
+def write_relationship_batch(session, tipo, batch, results):
+    """Write one relationship batch and record its outcome"""
+    try:
+        created = write_with_retry(session, create_relationships_batch, tipo, batch)
+        results["success"] += created
+        if created < len(batch):
+            results["failed"] += len(batch) - created
+            results["failures"].append({
+                "original_id": None,
+                "error": f"{len(batch) - created} endpoints not found in batch",
+                "relation": f"[:{tipo}]",
+            })
+    except Exception as e:
+        results["failed"] += len(batch)
+        for row in batch:
+            results["failures"].append({"original_id": None, "error": str(e), "relation": row["relation"]})
+
+def merge_results(total, partial):
+    total["success"] += partial["success"]
+    total["failed"] += partial["failed"]
+    total["failures"].extend(partial["failures"])
+
+def import_nodes_batched(driver, nodes, batch_size):
+    """Group nodes by label set and write each group with one UNWIND per batch inside explicit transactions"""
+    results = {"success": 0, "failed": 0, "failures": []}
+    node_mapping = {}
+    start = time.perf_counter()
+    with driver.session() as session:
+        batches = iter_grouped_batches(node_rows(nodes, results), lambda row: row["labels"], batch_size)
+        for labels, batch in batches:
+            write_node_batch(session, labels, batch, node_mapping, results)
+    results["elapsed"] = time.perf_counter() - start
+    return node_mapping, results
+
+def import_relationships_batched(driver, relationships, node_mapping, batch_size):
+    """Group relationships by type and write each group with one UNWIND per batch inside explicit transactions"""
+    results = {"success": 0, "failed": 0, "failures": []}
+    start = time.perf_counter()
+    with driver.session() as session:
+        rows = relationship_rows(relationships, node_mapping, results)
+        for tipo, batch in iter_grouped_batches(rows, lambda row: row["tipo"], batch_size):
+            write_relationship_batch(session, tipo, batch, results)
+    results["elapsed"] = time.perf_counter() - start
+    return results
+
+def import_nodes_parallel(driver, nodes, batch_size, workers):
+    """Like import_nodes_batched, but node batches are written concurrently by a pool of workers"""
+    results = {"success": 0, "failed": 0, "failures": []}
+    node_mapping = {}
+
+    def work(labels, batch):
+        partial_mapping = {}
+        partial = {"success": 0, "failed": 0, "failures": []}
+        with driver.session() as session:
+            write_node_batch(session, labels, batch, partial_mapping, partial)
+        return partial_mapping, partial
+
+    def collect(done):
+        for future in done:
+            partial_mapping, partial = future.result()
+            node_mapping.update(partial_mapping)
+            merge_results(results, partial)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = set()
+        for labels, batch in iter_grouped_batches(node_rows(nodes, results), lambda row: row["labels"], batch_size):
+            # Keep at most two batches per worker queued so streamed input stays bounded
+            if len(in_flight) >= workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight.add(executor.submit(work, labels, batch))
+        collect(wait(in_flight).done)
+    results["elapsed"] = time.perf_counter() - start
+    return node_mapping, results
+
+def node_bucket(element_id, buckets):
+    return zlib.crc32(element_id.encode("utf-8")) % buckets
+
+def partition_rounds(buckets):
+    """
+    Schedule every unordered bucket pair so that the pairs of a round never share a bucket.
+    Round-robin (circle method) for the cross-bucket pairs, plus one round with every bucket paired with itself.
+    """
+    order = list(range(buckets))
+    rounds = [[(bucket, bucket) for bucket in order]]
+    for _ in range(buckets - 1):
+        rounds.append([tuple(sorted((order[i], order[buckets - 1 - i]))) for i in range(buckets // 2)])
+        order = [order[0], order[-1]] + order[1:-1]
+    return rounds
+
+def import_relationships_parallel(driver, relationships, node_mapping, batch_size, workers):
+    """
+    Write relationships concurrently without lock contention.
+    Nodes are hashed into 2*workers buckets and each relationship goes to the partition of its (origen, destino)
+    bucket pair. Partitions run round by round, and the partitions of a round never share a bucket, so concurrent
+    transactions never touch the same node.
+    Partitions are spilled to NDJSON temp files (one per bucket pair) and read back batch by batch, so memory stays
+    flat with --stream input.
+    """
+    results = {"success": 0, "failed": 0, "failures": []}
+    buckets = workers * 2
+
+    def read_partition(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def work(path):
+        partial = {"success": 0, "failed": 0, "failures": []}
+        with driver.session() as session:
+            for tipo, batch in iter_grouped_batches(read_partition(path), lambda row: row["tipo"], batch_size):
+                write_relationship_batch(session, tipo, batch, partial)
+        return partial
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="rel_partitions_") as spill_dir:
+        spills = {}
+        try:
+            for row in relationship_rows(relationships, node_mapping, results):
+                pair = tuple(sorted((node_bucket(row["origen"], buckets), node_bucket(row["destino"], buckets))))
+                spill = spills.get(pair)
+                if spill is None:
+                    spill = spills[pair] = open(os.path.join(spill_dir, f"{pair[0]}_{pair[1]}.ndjson"), 'w', encoding='utf-8')
+                spill.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+        finally:
+            for spill in spills.values():
+                spill.close()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for pairs in partition_rounds(buckets):
+                futures = [executor.submit(work, spills[pair].name) for pair in pairs if pair in spills]
+                for future in futures:
+                    merge_results(results, future.result())
+    results["elapsed"] = time.perf_counter() - start
+    return results
+
+def write_nodes(driver, nodes, args):
+    """Dispatch to the serial or parallel batched node writer depending on --workers"""
+    if args.workers > 1:
+        return import_nodes_parallel(driver, nodes, args.batch_size, args.workers)
+    return import_nodes_batched(driver, nodes, args.batch_size)
+
+def write_relationships(driver, relationships, node_mapping, args):
+    """Dispatch to the serial or parallel batched relationship writer depending on --workers"""
+    if args.workers > 1:
+        return import_relationships_parallel(driver, relationships, node_mapping, args.batch_size, args.workers)
+    return import_relationships_batched(driver, relationships, node_mapping, args.batch_size)
+
+def print_node_summary(total, node_results):
+    """Print the node import summary"""
+    print("\n📊 Node Import Summary:")
+    print(f"  Total nodes: {total}")
+    print(f"  Successfully created: {node_results['success']}")
+    print(f"  Failed: {node_results['failed']}")
+    if "elapsed" in node_results:
+        rate = node_results["success"] / node_results["elapsed"] if node_results["elapsed"] else 0.0
+        print(f"  Time: {node_results['elapsed']:.2f}s ({rate:.1f} nodes/s)")
+
+    if node_results["failed"] > 0:
+        print("\n❌ Failed nodes:")
+        for fail in node_results["failures"]:
+            print(f"  Node ID: {fail['original_id']} - Error: {fail['error']}")
+
+def print_relationship_summary(total, rel_results):
+    """Print the relationship import summary"""
+    print("\n📊 Relationship Import Summary:")
+    print(f"  Total relationships: {total}")
+    print(f"  Successfully created: {rel_results['success']}")
+    print(f"  Failed: {rel_results['failed']}")
+    if "elapsed" in rel_results:
+        rate = rel_results["success"] / rel_results["elapsed"] if rel_results["elapsed"] else 0.0
+        print(f"  Time: {rel_results['elapsed']:.2f}s ({rate:.1f} relationships/s)")
+
+    if rel_results["failed"] > 0:
+        print("\n❌ Failed relationships:")
+        for fail in rel_results["failures"]:
+            print(f"  {fail['relation']} - Error: {fail['error']}")
+
 def process_json_file(file_path):
     """Read and parse JSON file"""
     try:
@@ -318,6 +707,60 @@ def extract_data(data):
     # Fallback
     return data
 
+def format_bd_id(original_id):
+    """Return the 'first:bd_id:last' form of an id, or the id unchanged if it doesn't have that shape"""
+    if isinstance(original_id, str) and ':' in original_id:
+        parts = original_id.split(':')
+        if len(parts) >= 3:
+            return f"{parts[0]}:bd_id:{parts[-1]}"
+    return original_id
+
+def is_ndjson_file(file_path):
+    return file_path.endswith((".ndjson", ".jsonl"))
+
+def ndjson_kind(item):
+    """Section of an NDJSON line: explicit 'kind' or, if missing, relationships are the lines with origen/destino"""
+    kind = item.get("kind")
+    if kind in ("node", "nodo"):
+        return "nodos"
+    if kind in ("relationship", "relacion"):
+        return "relaciones"
+    return "relaciones" if "origen" in item and "destino" in item else "nodos"
+
+def iter_json_items(file_path, section):
+    """Yield the items of 'nodos' or 'relaciones' one at a time without loading the whole file"""
+    if is_ndjson_file(file_path):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                item = json.loads(line)
+                if ndjson_kind(item) == section:
+                    item.pop("kind", None)
+                    yield item
+        return
+
+    if ijson is None:
+        print("❌ Streaming a .json file requires the 'ijson' package (pip install ijson); NDJSON files work without it")
+        sys.exit(1)
+    with open(file_path, 'rb') as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        # Same layouts as extract_data: [{"jsonResult": {...}}] or {"nodos": [...], "relaciones": [...]}
+        prefix = f"item.jsonResult.{section}.item" if first == b"[" else f"{section}.item"
+        yield from ijson.items(f, prefix, use_float=True)
+
+def stream_with_bd_id(items):
+    """Apply the bd_id rewrite to ids, origen and destino while items are streamed"""
+    for item in items:
+        for key in ("id", "origen", "destino"):
+            if key in item:
+                item[key] = format_bd_id(item[key])
+        yield item
+
 def process_ids_with_bd_id(data, bd_id=None):
     """Replace IDs with bd_id format"""
     print(f"🔄 Replacing IDs with 'bd_id'")
@@ -407,6 +850,367 @@ def process_ids_with_bd_id(data, bd_id=None):
     
     return data
 
+EMBEDDING_INDEXES_QUERY = """
+SHOW VECTOR INDEXES YIELD name, entityType, properties, options
+WHERE entityType = 'NODE' AND 'embedding' IN properties
+RETURN name, options.indexConfig['vector.dimensions'] AS dimensions
+"""
+
+def set_embeddings_batch(tx, rows):
+    query = (
+        "UNWIND $rows AS row "
+        "MATCH (n) WHERE elementId(n) = row.id "
+        "SET n.embedding = row.embedding"
+    )
+    tx.run(query, rows=rows).consume()
+
+def import_embeddings(driver, sidecar_path, node_mapping, batch_size, rewrite_ids=False):
+    """Bulk-load a .npy embeddings sidecar onto the imported nodes after checking it against the vector indexes"""
+    if np is None:
+        print("❌ Importing embeddings requires numpy (pip install numpy)")
+        return False
+    vectors = np.load(sidecar_path, mmap_mode="r")
+    with open(sidecar_ids_path(sidecar_path), 'r', encoding='utf-8') as ids_file:
+        ids = [line.strip() for line in ids_file]
+    if len(ids) != vectors.shape[0]:
+        print(f"❌ Sidecar mismatch: {len(ids)} ids for {vectors.shape[0]} vectors")
+        return False
+    dimensions = vectors.shape[1]
+
+    with driver.session() as session:
+        indexes = session.run(EMBEDDING_INDEXES_QUERY).data()
+    mismatched = [index for index in indexes if index["dimensions"] is not None and int(index["dimensions"]) != dimensions]
+    if mismatched:
+        for index in mismatched:
+            print(f"❌ Vector index '{index['name']}' expects {index['dimensions']} dimensions, sidecar has {dimensions}")
+        return False
+
+    print(f"\n🔄 Restoring {len(ids)} embeddings ({dimensions} dimensions)...")
+    results = {"success": 0, "skipped": 0, "failed": 0}
+    start = time.perf_counter()
+    with driver.session() as session:
+        for offset in range(0, len(ids), batch_size):
+            rows = []
+            for row, original_id in enumerate(ids[offset:offset + batch_size], start=offset):
+                node_id = node_mapping.get(format_bd_id(original_id) if rewrite_ids else original_id)
+                if node_id is None:
+                    results["skipped"] += 1
+                    continue
+                rows.append({"id": node_id, "embedding": vectors[row].astype("float32").tolist()})
+            if not rows:
+                continue
+            try:
+                write_with_retry(session, set_embeddings_batch, rows)
+                results["success"] += len(rows)
+            except Exception as e:
+                results["failed"] += len(rows)
+                print(f"❌ Failed to restore embeddings batch: {e}")
+    elapsed = time.perf_counter() - start
+
+    print("\n📊 Embedding Import Summary:")
+    print(f"  Total vectors: {len(ids)}")
+    print(f"  Restored: {results['success']}")
+    print(f"  Skipped (node not imported): {results['skipped']}")
+    print(f"  Failed: {results['failed']}")
+    rate = results["success"] / elapsed if elapsed else 0.0
+    print(f"  Time: {elapsed:.2f}s ({rate:.1f} vectors/s)")
+    return results["failed"] == 0
+
+UPSERT_LABEL = "Importado"
+UPSERT_ID_PROPERTY = "app_id"
+HASH_PROPERTY = "content_hash"
+
+def content_hash(payload):
+    """Stable sha256 of a node or relationship payload, independent of key order"""
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def relationship_app_id(rel):
+    return rel.get("id") or f"{rel.get('origen')}-[:{rel.get('tipo')}]->{rel.get('destino')}"
+
+def number_relationships(relationships):
+    """
+    Give repeated id-less relationships their own app_id: the first keeps origen-[:tipo]->destino and the next
+    ones get #2, #3... so parallel relationships of the same type don't collapse into one on upsert
+    """
+    seen = {}
+    for rel in relationships:
+        if not rel.get("id"):
+            base = relationship_app_id(rel)
+            seen[base] = seen.get(base, 0) + 1
+            if seen[base] > 1:
+                rel = {**rel, "id": f"{base}#{seen[base]}"}
+        yield rel
+
+def ensure_upsert_constraint(driver):
+    """Uniqueness constraint (and its backing index) on the application id of imported nodes"""
+    with driver.session() as session:
+        session.run(
+            f"CREATE CONSTRAINT importado_app_id IF NOT EXISTS "
+            f"FOR (n:{UPSERT_LABEL}) REQUIRE n.{UPSERT_ID_PROPERTY} IS UNIQUE"
+        ).consume()
+
+def find_duplicate_app_ids(session, limit=20):
+    """app_ids shared by more than one node (e.g. a plain re-import with --no-clean); they cannot be adopted"""
+    return session.run(
+        f"MATCH (n) WHERE n.{UPSERT_ID_PROPERTY} IS NOT NULL "
+        f"WITH n.{UPSERT_ID_PROPERTY} AS id, count(n) AS copies WHERE copies > 1 "
+        "RETURN id, copies ORDER BY copies DESC LIMIT $limit",
+        limit=limit,
+    ).data()
+
+def adopt_imported_nodes(tx):
+    """Label the nodes a plain import wrote (they carry app_id but not Importado) so the upsert MERGE matches them"""
+    record = tx.run(
+        f"MATCH (n) WHERE n.{UPSERT_ID_PROPERTY} IS NOT NULL AND NOT n:{UPSERT_LABEL} "
+        f"SET n:{UPSERT_LABEL} RETURN count(n) AS adopted"
+    ).single()
+    return record["adopted"] if record else 0
+
+def count_untracked_nodes(session):
+    """Nodes without app_id: written by the API or by an import that predates app_id, so they cannot be matched"""
+    return session.run(f"MATCH (n) WHERE n.{UPSERT_ID_PROPERTY} IS NULL RETURN count(n) AS untracked").single()["untracked"]
+
+def fetch_existing_nodes(session):
+    """app_id -> (content hash, labels) of every node written by a previous upsert or import"""
+    result = session.run(
+        f"MATCH (n) WHERE n.{UPSERT_ID_PROPERTY} IS NOT NULL "
+        f"RETURN n.{UPSERT_ID_PROPERTY} AS id, n.{HASH_PROPERTY} AS hash, labels(n) AS labels"
+    )
+    return {
+        record["id"]: (record["hash"], tuple(label for label in record["labels"] if label != UPSERT_LABEL))
+        for record in result
+    }
+
+def fetch_existing_relationships(session):
+    """app_id -> (content hash, elementId) of every relationship written by a previous upsert or import"""
+    result = session.run(
+        f"MATCH (a)-[r]->(b) WHERE r.{UPSERT_ID_PROPERTY} IS NOT NULL "
+        f"AND a.{UPSERT_ID_PROPERTY} IS NOT NULL AND b.{UPSERT_ID_PROPERTY} IS NOT NULL "
+        f"RETURN r.{UPSERT_ID_PROPERTY} AS id, r.{HASH_PROPERTY} AS hash, elementId(r) AS element_id"
+    )
+    return {record["id"]: (record["hash"], record["element_id"]) for record in result}
+
+def upsert_nodes_batch(tx, labels, rows):
+    """MERGE a batch of nodes on app_id; the embedding is kept unless the description changed"""
+    labels_str = ":" + ":".join(labels) if labels else ""
+    query = (
+        "UNWIND $rows AS row "
+        f"MERGE (n:{UPSERT_LABEL} {{{UPSERT_ID_PROPERTY}: row.id}}) "
+        "WITH n, row, n.embedding AS old_embedding, n.description AS old_description "
+        "SET n = row.propiedades "
+        f"SET n.{UPSERT_ID_PROPERTY} = row.id, n.{HASH_PROPERTY} = row.hash, "
+        "n.embedding = CASE WHEN old_description = row.propiedades.description THEN old_embedding ELSE null END "
+        + (f"SET n{labels_str} " if labels_str else "")
+        + "RETURN row.id AS original_id, elementId(n) AS nodeId"
+    )
+    result = tx.run(query, rows=rows)
+    return {record["original_id"]: record["nodeId"] for record in result}
+
+def remove_labels_batch(tx, labels, ids):
+    tx.run(
+        f"UNWIND $ids AS id MATCH (n:{UPSERT_LABEL} {{{UPSERT_ID_PROPERTY}: id}}) REMOVE n:" + ":".join(labels),
+        ids=ids,
+    ).consume()
+
+def delete_nodes_batch(tx, ids):
+    tx.run(
+        f"UNWIND $ids AS id MATCH (n:{UPSERT_LABEL} {{{UPSERT_ID_PROPERTY}: id}}) DETACH DELETE n",
+        ids=ids,
+    ).consume()
+
+def delete_relationships_batch(tx, element_ids):
+    tx.run("UNWIND $ids AS id MATCH ()-[r]->() WHERE elementId(r) = id DELETE r", ids=element_ids).consume()
+
+def upsert_relationships_batch(tx, tipo, rows):
+    query = (
+        "UNWIND $rows AS row "
+        f"MATCH (a:{UPSERT_LABEL} {{{UPSERT_ID_PROPERTY}: row.origen}}) "
+        f"MATCH (b:{UPSERT_LABEL} {{{UPSERT_ID_PROPERTY}: row.destino}}) "
+        f"CREATE (a)-[r:{tipo}]->(b) "
+        f"SET r = row.propiedades, r.{UPSERT_ID_PROPERTY} = row.id, r.{HASH_PROPERTY} = row.hash "
+        "RETURN count(r) AS created"
+    )
+    record = tx.run(query, rows=rows).single()
+    return record["created"] if record else 0
+
+def upsert_import(driver, nodes, relationships, args):
+    """
+    Idempotent import keyed on app_id: only rows whose content hash changed are written,
+    and nodes/relationships missing from the input are deleted. Returns the app_id -> elementId
+    mapping of the nodes written in this run.
+    """
+    ensure_upsert_constraint(driver)
+    start = time.perf_counter()
+    node_stats = {"unchanged": 0, "written": 0, "deleted": 0, "failed": 0}
+    rel_stats = {"unchanged": 0, "written": 0, "deleted": 0, "failed": 0}
+    node_mapping = {}
+
+    with driver.session() as session:
+        if args.relationships_only:
+            nodes = []
+        existing_nodes = {} if args.relationships_only else fetch_existing_nodes(session)
+        if not args.relationships_only and not existing_nodes and not args.allow_untracked:
+            untracked = count_untracked_nodes(session)
+            if untracked:
+                # Without app_id these nodes cannot be matched to the input: upserting would duplicate them
+                print(f"❌ The database has {untracked} nodes without {UPSERT_ID_PROPERTY} and none written by an import.")
+                print("   Re-import them with a plain import (which records app_id) or clean the database first;")
+                print("   pass --allow-untracked to upsert alongside them anyway.")
+                sys.exit(1)
+        duplicates = find_duplicate_app_ids(session) if existing_nodes else []
+        if duplicates:
+            # Adopting them would break the importado_app_id uniqueness constraint
+            print(f"❌ Some {UPSERT_ID_PROPERTY} values belong to more than one node (showing up to {len(duplicates)}):")
+            for duplicate in duplicates:
+                print(f"   {duplicate['id']}: {duplicate['copies']} nodes")
+            print("   Remove the extra copies (or clean the database and re-import) before upserting.")
+            sys.exit(1)
+        if not args.dry_run and existing_nodes:
+            adopted = write_with_retry(session, adopt_imported_nodes)
+            if adopted:
+                print(f"🔄 Adopted {adopted} nodes written by a plain import")
+        seen_nodes = set()
+        stale_labels = {}
+        pending = []
+        for node in nodes:
+            node_id = node.get("id")
+            if node_id is None:
+                node_stats["failed"] += 1
+                continue
+            seen_nodes.add(node_id)
+            labels = tuple(get_node_labels(node))
+            propiedades = get_properties(node)
+            digest = content_hash({"labels": sorted(labels), "properties": propiedades})
+            previous = existing_nodes.get(node_id)
+            if previous and previous[0] == digest:
+                node_stats["unchanged"] += 1
+                continue
+            if previous:
+                removed = tuple(label for label in previous[1] if label not in labels)
+                if removed:
+                    stale_labels.setdefault(removed, []).append(node_id)
+            pending.append({"id": node_id, "labels": labels, "propiedades": propiedades, "hash": digest})
+
+        missing_nodes = [node_id for node_id in existing_nodes if node_id not in seen_nodes]
+        del existing_nodes
+
+        if args.dry_run:
+            node_stats["written"] = len(pending)
+            node_stats["deleted"] = len(missing_nodes)
+        else:
+            for labels, ids in stale_labels.items():
+                write_with_retry(session, remove_labels_batch, labels, ids)
+            for labels, batch in iter_grouped_batches(pending, lambda row: row["labels"], args.batch_size):
+                try:
+                    node_mapping.update(write_with_retry(session, upsert_nodes_batch, labels, batch))
+                    node_stats["written"] += len(batch)
+                except Exception as e:
+                    node_stats["failed"] += len(batch)
+                    print(f"❌ Failed to upsert node batch {labels}: {e}")
+            for offset in range(0, len(missing_nodes), args.batch_size):
+                batch = missing_nodes[offset:offset + args.batch_size]
+                write_with_retry(session, delete_nodes_batch, batch)
+                node_stats["deleted"] += len(batch)
+        del pending
+
+        if args.nodes_only:
+            relationships = []
+        existing_rels = {} if args.nodes_only else fetch_existing_relationships(session)
+        seen_rels = set()
+        to_delete = []
+        pending = []
+        for rel in number_relationships(relationships):
+            origen, destino, tipo = rel.get("origen"), rel.get("destino"), rel.get("tipo")
+            if None in [origen, destino, tipo]:
+                rel_stats["failed"] += 1
+                continue
+            rel_id = relationship_app_id(rel)
+            seen_rels.add(rel_id)
+            propiedades = get_properties(rel)
+            digest = content_hash({"tipo": tipo, "origen": origen, "destino": destino, "properties": propiedades})
+            previous = existing_rels.get(rel_id)
+            if previous and previous[0] == digest:
+                rel_stats["unchanged"] += 1
+                continue
+            if previous:
+                to_delete.append(previous[1])
+            pending.append({"id": rel_id, "tipo": tipo, "origen": origen, "destino": destino,
+                            "propiedades": propiedades, "hash": digest})
+        to_delete.extend(element_id for rel_id, (_, element_id) in existing_rels.items() if rel_id not in seen_rels)
+        removed_rels = len(existing_rels) - len(seen_rels & existing_rels.keys())
+        del existing_rels
+
+        if args.dry_run:
+            rel_stats["written"] = len(pending)
+            rel_stats["deleted"] = removed_rels
+        else:
+            for offset in range(0, len(to_delete), args.batch_size):
+                write_with_retry(session, delete_relationships_batch, to_delete[offset:offset + args.batch_size])
+            rel_stats["deleted"] = removed_rels
+            for tipo, batch in iter_grouped_batches(pending, lambda row: row["tipo"], args.batch_size):
+                try:
+                    created = write_with_retry(session, upsert_relationships_batch, tipo, batch)
+                    rel_stats["written"] += created
+                    rel_stats["failed"] += len(batch) - created
+                except Exception as e:
+                    rel_stats["failed"] += len(batch)
+                    print(f"❌ Failed to upsert relationship batch [:{tipo}]: {e}")
+
+    elapsed = time.perf_counter() - start
+    print("\n📊 Upsert Summary:" + (" (dry run)" if args.dry_run else ""))
+    print(f"  Nodes: {node_stats['written']} written, {node_stats['unchanged']} unchanged, "
+          f"{node_stats['deleted']} deleted, {node_stats['failed']} failed")
+    print(f"  Relationships: {rel_stats['written']} written, {rel_stats['unchanged']} unchanged, "
+          f"{rel_stats['deleted']} deleted, {rel_stats['failed']} failed")
+    print(f"  Time: {elapsed:.2f}s")
+    return node_mapping
+
+def stream_import(driver, args):
+    """Import nodos and relaciones straight from the file in fixed-size batches, keeping memory flat"""
+    print(f"🔄 Streaming import from {args.json_file} (batch size: {args.batch_size})")
+    if not args.dry_run and not args.no_clean and not args.upsert:
+        print("🔄 Cleaning database...")
+        if not clean_database(driver):
+            print("⚠️ Failed to clean database, proceeding with import anyway")
+    elif args.dry_run:
+        print("🔍 DRY RUN MODE - No changes will be made to the database")
+
+    def items(section):
+        stream = iter_json_items(args.json_file, section)
+        return stream_with_bd_id(stream) if args.bd_id else stream
+
+    if args.upsert:
+        node_mapping = upsert_import(driver, items("nodos"), items("relaciones"), args)
+        if args.embeddings and not args.dry_run:
+            import_embeddings(driver, args.embeddings, node_mapping, args.batch_size, rewrite_ids=bool(args.bd_id))
+        return
+
+    node_mapping = {}
+    if not args.relationships_only:
+        if args.dry_run:
+            node_results = import_nodes(driver, items("nodos"), node_mapping, dry_run=True)
+        else:
+            node_mapping, node_results = write_nodes(driver, items("nodos"), args)
+        print_node_summary(node_results["success"] + node_results["failed"], node_results)
+
+    if not args.nodes_only:
+        if args.dry_run:
+            rel_results = import_relationships(driver, items("relaciones"), node_mapping, dry_run=True)
+        else:
+            rel_results = write_relationships(driver, items("relaciones"), node_mapping, args)
+        print_relationship_summary(rel_results["success"] + rel_results["failed"], rel_results)
+
+    if args.embeddings and not args.dry_run:
+        import_embeddings(driver, args.embeddings, node_mapping, args.batch_size, rewrite_ids=bool(args.bd_id))
+
+def mark_graph_changed(args):
+    """Bump the shared graph revision so the API drops its caches and clients reload the graph"""
+    if args.dry_run:
+        return
+    revision = graph_version.bump()
+    print(f"🔄 Graph revision is now {revision}")
+
 def main():
     parser = argparse.ArgumentParser(description="Import/export nodes and relationships between JSON and Neo4j")
     
@@ -421,11 +1225,22 @@ def main():
     import_parser.add_argument("--nodes-only", action="store_true", help="Import only nodes, ignore relationships")
     import_parser.add_argument("--relationships-only", action="store_true", help="Import only relationships, ignore nodes")
     import_parser.add_argument("--no-clean", action="store_true", help="Don't clean the database before importing")
+    import_parser.add_argument("--batched", action="store_true", help="Write nodes by label set and relationships by type with UNWIND batches")
+    import_parser.add_argument("--batch-size", type=int, default=1000, help="Rows per UNWIND batch in --batched mode (default: 1000)")
+    import_parser.add_argument("--upsert", action="store_true", help="Idempotent import keyed on app_id: write only rows whose content hash changed and delete rows missing from the file (never cleans the database)")
+    import_parser.add_argument("--allow-untracked", action="store_true", help="Let --upsert run on a database whose nodes have no app_id (they are left untouched and never matched)")
+    import_parser.add_argument("--embeddings", help="Embeddings sidecar (.npy) written by export --embeddings, loaded back onto the imported nodes")
+    import_parser.add_argument("--workers", type=int, default=1, help="Concurrent writers for batched import; relationships are partitioned (spilled to temp files, so it combines with --stream) so workers never share nodes (default: 1)")
+    import_parser.add_argument("--stream", action="store_true", help="Read nodos/relaciones incrementally (ijson or NDJSON input) and import them in batches")
     
     # Export command
     export_parser = subparsers.add_parser("export", help="Export data from Neo4j to JSON")
     export_parser.add_argument("output_file", help="Path to save the exported JSON data")
     export_parser.add_argument("bd_id", nargs="?", help="Database ID to use in node and relationship IDs")
+    export_parser.add_argument("--embeddings", help="Also write node embeddings to this .npy sidecar (ids go to <name>.ids.txt)")
+    export_parser.add_argument("--embeddings-dtype", choices=["float32", "float16"], default="float32", help="Sidecar dtype (default: float32)")
+    export_parser.add_argument("--page-size", type=int, default=1000, help="Nodes/relationships fetched per page (default: 1000)")
+    export_parser.add_argument("--format", dest="output_format", choices=["json", "ndjson"], help="Output format (default: ndjson for .ndjson/.jsonl files, json otherwise)")
     
     args = parser.parse_args()
     
@@ -441,6 +1256,13 @@ def main():
             args.nodes_only = "--nodes-only" in sys.argv
             args.relationships_only = "--relationships-only" in sys.argv
             args.no_clean = "--no-clean" in sys.argv
+            args.batched = "--batched" in sys.argv
+            args.stream = "--stream" in sys.argv
+            args.workers = 1
+            args.embeddings = None
+            args.upsert = "--upsert" in sys.argv
+            args.allow_untracked = "--allow-untracked" in sys.argv
+            args.batch_size = 1000
             # Try to extract bd_id if present
             bd_id_args = [arg for arg in sys.argv[2:] if not arg.startswith("--")]
             args.bd_id = bd_id_args[0] if bd_id_args else None
@@ -454,11 +1276,18 @@ def main():
     if args.command == "export":
         # Export database to JSON file
         print(f"🔍 Exporting with bd_id: {args.bd_id}")
-        if export_database(driver, args.output_file, args.bd_id):
+        exported = export_database(driver, args.output_file, args.bd_id, args.page_size, args.output_format)
+        if exported and args.embeddings:
+            exported = export_embeddings(driver, args.embeddings, args.page_size, args.embeddings_dtype)
+        if exported:
             print("✅ Export completed successfully")
         else:
             print("❌ Export failed")
     
+    elif args.command == "import" and args.stream:
+        stream_import(driver, args)
+        mark_graph_changed(args)
+    
     elif args.command == "import":
         # Load data from JSON file
         raw_data = process_json_file(args.json_file)
@@ -471,6 +1300,14 @@ def main():
             data = process_ids_with_bd_id(data, args.bd_id)
             print(f"🔄 Replaced IDs with bd_id: {args.bd_id}")
         
+        if args.upsert:
+            node_mapping = upsert_import(driver, data.get("nodos", []), data.get("relaciones", []), args)
+            if args.embeddings and not args.dry_run:
+                import_embeddings(driver, args.embeddings, node_mapping, args.batch_size, rewrite_ids=bool(args.bd_id))
+            mark_graph_changed(args)
+            driver.close()
+            return
+        
         # Clean database if not in dry-run mode and --no-clean not specified
         if not args.dry_run and not args.no_clean:
             print("🔄 Cleaning database...")
@@ -481,110 +1318,35 @@ def main():
         
         # Mapeo de IDs originales a IDs internos de Neo4j
         node_mapping = {}
+        batched = (args.batched or args.workers > 1) and not args.dry_run
         
         # Import nodes if present and not in relationships-only mode
         if "nodos" in data and not args.relationships_only:
             nodes = data.get("nodos", [])
             if nodes:
                 print(f"🔄 Processing {len(nodes)} nodes...")
-                
-                node_results = {
-                    "success": 0,
-                    "failed": 0,
-                    "failures": []
-                }
-                
-                for node in nodes:
-                    # Print the node without embedding in dry run mode
-                    if args.dry_run:
-                        node_copy = node.copy()
-                        if "propiedades" in node_copy and "embedding" in node_copy["propiedades"]:
-                            node_copy["propiedades"] = node_copy["propiedades"].copy()
-                            del node_copy["propiedades"]["embedding"]
-                        elif "properties" in node_copy and "embedding" in node_copy["properties"]:
-                            node_copy["properties"] = node_copy["properties"].copy()
-                            del node_copy["properties"]["embedding"]
-                        print(f"Would create node: {node_copy}")
-                        continue
-                    
-                    result = create_node(driver, node)
-                    
-                    if result.get("success", False):
-                        node_results["success"] += 1
-                        # Almacenar el mapeo de ID original a ID interno de Neo4j
-                        node_mapping[node.get('id')] = result['nodeId']
-                        print(f"✅ Created node with ID: {result['nodeId']} (Original ID: {node.get('id')})")
-                    else:
-                        node_results["failed"] += 1
-                        error_info = {
-                            "original_id": result.get("original_id"),
-                            "error": result.get("error")
-                        }
-                        node_results["failures"].append(error_info)
-                        print(f"❌ Failed to create node with ID: {node.get('id')}")
-                        print(f"   Error: {result.get('error')}")
-                
-                print("\n📊 Node Import Summary:")
-                print(f"  Total nodes: {len(nodes)}")
-                print(f"  Successfully created: {node_results['success']}")
-                print(f"  Failed: {node_results['failed']}")
-                
-                if node_results["failed"] > 0:
-                    print("\n❌ Failed nodes:")
-                    for fail in node_results["failures"]:
-                        print(f"  Node ID: {fail['original_id']} - Error: {fail['error']}")
+                if batched:
+                    node_mapping, node_results = write_nodes(driver, nodes, args)
+                else:
+                    node_results = import_nodes(driver, nodes, node_mapping, args.dry_run)
+                print_node_summary(len(nodes), node_results)
         
         # Import relationships if present and not in nodes-only mode
         if "relaciones" in data and not args.nodes_only:
             relationships = data.get("relaciones", [])
             if relationships:
                 print(f"\n🔄 Processing {len(relationships)} relationships...")
-                
-                rel_results = {
-                    "success": 0,
-                    "failed": 0,
-                    "failures": []
-                }
-                
-                # Process each relationship
-                for rel in relationships:
-                    if args.dry_run:
-                        # Just print relationship info in dry run mode
-                        rel_copy = rel.copy()
-                        if "propiedades" in rel_copy and "embedding" in rel_copy["propiedades"]:
-                            rel_copy["propiedades"] = rel_copy["propiedades"].copy()
-                            del rel_copy["propiedades"]["embedding"]
-                        elif "properties" in rel_copy and "embedding" in rel_copy["properties"]:
-                            rel_copy["properties"] = rel_copy["properties"].copy()
-                            del rel_copy["properties"]["embedding"]
-                        print(f"Would create: {rel_copy['origen']} -[:{rel_copy['tipo']}]-> {rel_copy['destino']}")
-                        continue
-                    
-                    result = create_relationship(driver, rel, node_mapping)
-                    
-                    if result.get("success", False):
-                        rel_results["success"] += 1
-                        print(f"✅ Created relationship: {rel['origen']} -[:{rel['tipo']}]-> {rel['destino']} (ID: {result['relId']})")
-                    else:
-                        rel_results["failed"] += 1
-                        error_info = {
-                            "original_id": result.get("original_id"),
-                            "error": result.get("error"),
-                            "relation": f"{rel['origen']} -[:{rel['tipo']}]-> {rel['destino']}"
-                        }
-                        rel_results["failures"].append(error_info)
-                        print(f"❌ Failed to create relationship: {rel['origen']} -[:{rel['tipo']}]-> {rel['destino']}")
-                        print(f"   Error: {result.get('error')}")
-                
-                print("\n📊 Relationship Import Summary:")
-                print(f"  Total relationships: {len(relationships)}")
-                print(f"  Successfully created: {rel_results['success']}")
-                print(f"  Failed: {rel_results['failed']}")
-                
-                if rel_results["failed"] > 0:
-                    print("\n❌ Failed relationships:")
-                    for fail in rel_results["failures"]:
-                        print(f"  {fail['relation']} - Error: {fail['error']}")
+                if batched:
+                    rel_results = write_relationships(driver, relationships, node_mapping, args)
+                else:
+                    rel_results = import_relationships(driver, relationships, node_mapping, args.dry_run)
+                print_relationship_summary(len(relationships), rel_results)
+        
+        # Restore embeddings from the sidecar written by export --embeddings
+        if args.embeddings and not args.dry_run:
+            import_embeddings(driver, args.embeddings, node_mapping, args.batch_size, rewrite_ids=bool(args.bd_id))
+        
+        mark_graph_changed(args)
     
     # Clean up
     if driver: